@@ -5,6 +5,8 @@ from multiprocessing import Process
 import time
 
 from get_links import get_links
+from work_queue import build_queue
+from config import Config as cfg
 
 import json
 
@@ -26,6 +28,8 @@ def parse_args():
     parser.add_argument('--max-links', type=int, default=90, required=False, help="Maximum number of links to collect")
     parser.add_argument('--page-offset', type=int, default=1, required=False, help="Number of threads to use (default is 1)")
     parser.add_argument('--links', nargs='+', default=None, required=False, help="List of pre-generated links to work with")
+    parser.add_argument('--resume', action='store_true', help="Continue a previous run: keep its queue and skip links already in the workers' journals")
+    parser.add_argument('--index', type=str, default=cfg.auction_index_path, required=False, help="Shared SQLite index of processed auctions, used by every worker and run")
     parser.add_argument('--car-brand', type=str, required=True, help="Car brand to use for prompts. Supported brands: audi, toyota, nissan, suzuki, honda, daihatsu, subaru, mazda, bmw, lexus, volkswagen, volvo, mini, fiat, citroen, renault, ford, isuzu, opel, mitsubishi, mercedes, jaguar, peugeot, porsche, alfa_romeo, chevrolet")
 
     args = parser.parse_args()
@@ -35,15 +39,6 @@ def parse_args():
     
     return args
 
-def get_part(arr, k, i):
-    part_size = len(arr) // k
-    remainder = len(arr) % k
-
-    start_index = i * part_size + min(i, remainder)
-    end_index = start_index + part_size + (1 if i < remainder else 0)
-
-    return arr[start_index:end_index]
-
 def show_last_log_lines(page_offset, n=10):
     log_filename = f"process_log{page_offset}.log"
 
@@ -62,9 +57,7 @@ def show_last_log_lines(page_offset, n=10):
         print(f"Failed while reading {log_filename}: {e}")
 
 # Function to start a script and save the reference to the process
-def run_script(args, process_dict, links):
-    link_args = get_part(links, N, int(args["page_offset"]))
-
+def run_script(args, process_dict, queue_path):
     command = [
         "python", "main.py",
         "--model", args["model"],
@@ -74,7 +67,9 @@ def run_script(args, process_dict, links):
         "--prompt", args["prompt"],
         "--car-brand", args["car_brand"],
         "--page-offset", args["page_offset"],
-        "--links", *link_args
+        "--queue", queue_path,
+        "--index", args["index"],
+        *(["--resume"] if args["resume"] else [])
     ]
 
     print(f"Starting command: {' '.join(command)}")
@@ -98,6 +93,7 @@ def main():
     N = args.page_offset
 
     links = args.links or get_links(args.car_brand, args.max_steps, args.max_links, 0)
+    queue_path = build_queue(links, args.save_file_name, args.resume, args.index)
 
     script_arguments = [
         {
@@ -107,7 +103,9 @@ def main():
             "gemini_api_model": args.gemini_api_model,
             "prompt": args.prompt,
             "car_brand": args.car_brand,
-            "page_offset": str(i)
+            "page_offset": str(i),
+            "resume": args.resume,
+            "index": args.index
         }
         for i in range(N)  
     ]
@@ -116,7 +114,7 @@ def main():
 
     # Start processes
     for args in script_arguments:
-        run_script(args, process_dict, links)
+        run_script(args, process_dict, queue_path)
 
     # Simple command-line interface to manage processes
     try:
@@ -10,6 +10,8 @@ import nest_asyncio
 import asyncio
 
 from get_links import get_links
+from work_queue import build_queue
+from config import Config as cfg
 
 from telegram import Update
 from telegram.ext import (
@@ -40,6 +42,8 @@ def parse_args():
     parser.add_argument('--max-links', type=int, default=90, required=False, help="Maximum number of links to collect")
     parser.add_argument('--page-offset', type=int, default=1, required=False, help="Number of threads to use (default is 1)")
     parser.add_argument('--links', nargs='+', default=None, required=False, help="List of pre-generated links to work with")
+    parser.add_argument('--resume', action='store_true', help="Continue a previous run: keep its queue and skip links already in the workers' journals")
+    parser.add_argument('--index', type=str, default=cfg.auction_index_path, required=False, help="Shared SQLite index of processed auctions, used by every worker and run")
     parser.add_argument('--telegram-token', type=str, required=True, help="Your Telegram API token")
     parser.add_argument('--chat-id', type=int, required=True, help="Your chat ID with bot. Use get_chat_id.py to define it")
     parser.add_argument('--car-brand', type=str, required=True, help="Car brand to use for prompts. Supported brands: audi, toyota, nissan, suzuki, honda, daihatsu, subaru, mazda, bmw, lexus, volkswagen, volvo, mini, fiat, citroen, renault, ford, isuzu, opel, mitsubishi, mercedes, jaguar, peugeot, porsche, alfa_romeo, chevrolet")
@@ -52,15 +56,6 @@ def parse_args():
     return args
 
 
-def get_part(arr, k, i):
-    part_size = len(arr) // k
-    remainder = len(arr) % k
-
-    start_index = i * part_size + min(i, remainder)
-    end_index = start_index + part_size + (1 if i < remainder else 0)
-
-    return arr[start_index:end_index]
-
 def show_last_log_lines(offset, lines=10):
   file_name = f"/content/part-number-recognition/process_log{offset}.log"
   try:
@@ -72,9 +67,7 @@ def show_last_log_lines(offset, lines=10):
 
 
 # Function to start a script and save the reference to the process
-def run_script(args, process_dict, links):
-    link_args = get_part(links, N, int(args["page_offset"]))
-
+def run_script(args, process_dict, queue_path):
     command = [
         "python", "main.py",
         "--model", args["model"],
@@ -84,7 +77,9 @@ def run_script(args, process_dict, links):
         "--prompt", args["prompt"],
         "--car-brand", args["car_brand"],
         "--page-offset", args["page_offset"],
-        "--links", *link_args
+        "--queue", queue_path,
+        "--index", args["index"],
+        *(["--resume"] if args["resume"] else [])
     ]
 
     process = subprocess.Popen(
@@ -210,6 +205,7 @@ if __name__ == "__main__":
     CHAT_ID = args.chat_id
 
     links = args.links or get_links(args.car_brand, args.max_steps, args.max_links, 0)
+    queue_path = build_queue(links, args.save_file_name, args.resume, args.index)
 
     script_arguments = [
         {
@@ -219,14 +215,16 @@ if __name__ == "__main__":
             "gemini_api_model": args.gemini_api_model,
             "prompt": args.prompt,
             "car_brand": args.car_brand,
-            "page_offset": str(i)
+            "page_offset": str(i),
+            "resume": args.resume,
+            "index": args.index
         }
         for i in range(N)  
     ]
 
     # Start processes
     for arg in script_arguments:
-        run_script(arg, process_dict, links)
+        run_script(arg, process_dict, queue_path)
 
     nest_asyncio.apply()
     async def main():
@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+
+from config import Config as cfg
+from sqlite_store import SQLiteStore
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class BloomFilter():
+    """
+    In-memory Bloom filter of strings sized for `capacity` items at `error_rate` false positives.
+    """
+    def __init__(self, capacity, error_rate):
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item):
+        # Double hashing: two 64-bit halves of one SHA-256 give all k positions
+        digest = hashlib.sha256(item.encode('utf-8')).digest()
+        h1, h2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:16], 'little')
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class AuctionIndex(SQLiteStore):
+    """
+    Persistent index of auction IDs that are processed or being processed, shared by
+    every main.py worker and every run.
+
+    claim() is an atomic SQLite transaction, so two workers never recognize the same
+    auction. An in-memory Bloom filter in front of the table answers "never seen"
+    without touching SQLite; it is refreshed incrementally from the table.
+    """
+    def __init__(self, path=None, claim_timeout=None):
+        super().__init__(path or cfg.auction_index_path)
+        self.claim_timeout = claim_timeout or cfg.auction_index_claim_timeout
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS auctions (
+                auction_id TEXT PRIMARY KEY,
+                url TEXT,
+                status TEXT NOT NULL,
+                worker TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+
+        self.bloom = BloomFilter(cfg.auction_index_bloom_capacity, cfg.auction_index_bloom_error_rate)
+        self.bloom_lock = threading.Lock()
+        self.last_rowid = 0
+        self.refresh()
+
+    def refresh(self):
+        """
+        Add auction IDs written since the last refresh (by any process) to the Bloom filter.
+        """
+        with self.bloom_lock:
+            rows = self._connect().execute("SELECT rowid, auction_id FROM auctions WHERE rowid > ? ORDER BY rowid",
+                                           (self.last_rowid,)).fetchall()
+            for rowid, auction_id in rows:
+                self.bloom.add(auction_id)
+                self.last_rowid = rowid
+        return len(rows)
+
+    def __contains__(self, auction_id):
+        """
+        Whether the auction is done or claimed by a live worker.
+        """
+        if auction_id is None:
+            return False
+        with self.bloom_lock:
+            if auction_id not in self.bloom:
+                return False
+        # Bloom filter hits can be false positives, the table has the final word
+        row = self._connect().execute("SELECT status, updated_at FROM auctions WHERE auction_id = ?", (auction_id,)).fetchone()
+        return row is not None and self._is_taken(*row)
+
+    def _is_taken(self, status, updated_at):
+        return status == 'done' or (status == 'claimed' and time.time() - updated_at < self.claim_timeout)
+
+    def filter_new(self, links, auction_id_fn):
+        """
+        Return the links whose auction is neither done nor claimed.
+        """
+        self.refresh()
+        new_links = [link for link in links if auction_id_fn(link) not in self]
+        if len(new_links) < len(links):
+            logging.info(f"Auction index: skipping {len(links) - len(new_links)} already processed listings")
+        return new_links
+
+    def claim(self, auction_id, url=None, worker=None):
+        """
+        Atomically reserve an auction for one worker.
+
+        Claims older than claim_timeout (their worker died) and failed auctions can be claimed again.
+
+        Returns:
+            bool: True if this worker may process the auction.
+        """
+        if auction_id is None:
+            return True
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT status, updated_at FROM auctions WHERE auction_id = ?", (auction_id,)).fetchone()
+            claimed = row is None or not self._is_taken(*row)
+            if claimed:
+                conn.execute("INSERT OR REPLACE INTO auctions (auction_id, url, status, worker, updated_at) VALUES (?, ?, 'claimed', ?, ?)",
+                             (auction_id, url, str(worker or os.getpid()), time.time()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if claimed:
+            with self.bloom_lock:
+                self.bloom.add(auction_id)
+        return claimed
+
+    def is_done(self, auction_id):
+        """
+        Whether the auction was already recognized by some worker.
+        """
+        if auction_id is None:
+            return False
+        row = self._connect().execute("SELECT status FROM auctions WHERE auction_id = ?", (auction_id,)).fetchone()
+        return row is not None and row[0] == 'done'
+
+    def mark_done(self, auction_id):
+        if auction_id is None:
+            return
+        self._connect().execute("UPDATE auctions SET status = 'done', updated_at = ? WHERE auction_id = ?",
+                                (time.time(), auction_id))
+
+    def release(self, auction_id):
+        """
+        Give up a claim after a failure, so a later run can try the auction again.
+        """
+        if auction_id is None:
+            return
+        self._connect().execute("UPDATE auctions SET status = 'failed', updated_at = ? WHERE auction_id = ? AND status = 'claimed'",
+                                (time.time(), auction_id))
+
+    def release_claims(self, claims):
+        """
+        Release the claims of workers that are known to be dead, e.g. the workers of a
+        crashed run that is being resumed.
+
+        Args:
+            claims (list): (auction_id, worker) pairs. A claim is only released while it is
+                still held by that worker, so claims taken over by live workers are kept.
+        """
+        rows = [(time.time(), auction_id, str(worker)) for auction_id, worker in claims if auction_id is not None]
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("UPDATE auctions SET status = 'failed', updated_at = ? WHERE auction_id = ? AND status = 'claimed' AND worker = ?",
+                             rows)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logging.info(f"Auction index: released {len(rows)} claims of unfinished workers")
+
+    def counts(self):
+        """
+        Return the number of auctions per status.
+        """
+        return dict(self._connect().execute("SELECT status, COUNT(*) FROM auctions GROUP BY status").fetchall())
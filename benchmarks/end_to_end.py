@@ -0,0 +1,288 @@
+"""
+Offline end-to-end throughput benchmark of main.reduce.
+
+Starts one local HTTP server that stands in for Yahoo (search pages, listing pages
+in both layouts parse_images_from_page supports, images) and for the Gemini API
+(configurable latency, 429 rate and answers), then runs the full reduce pipeline
+against it: link collection, listing fetch, picker, Gemini recognition and result
+streaming.
+
+Reports listings/min, p50/p95 per-listing latency and Gemini API calls per listing.
+
+Usage Example:
+
+    python benchmarks/end_to_end.py --listings 200 --concurrency 8 --gemini-latency 1.5 --rate-429 0.05
+"""
+import argparse
+import io
+import json
+import math
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config as cfg
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+FIXTURE_AUCTION_ID = 'x1100000000'
+FIXTURE_IMAGE_PREFIX = f'https://auctions.c.yimg.jp/images.auctions.yahoo.co.jp/image/dr000/auc0101/users/0000/i-img1200x900-{FIXTURE_AUCTION_ID}'
+LISTINGS_PER_PAGE = 100
+
+
+def auction_id(i):
+    # Newest first, like the s1=new&o1=d searches in prompts.json
+    return f"x{2000000000 - i}"
+
+
+def build_image(width=1200, height=900):
+    img = Image.new('RGB', (width, height), (90, 90, 90))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([width // 4, height // 3, width * 3 // 4, height * 2 // 3], fill=(235, 235, 235))
+    draw.text((width // 4 + 20, height // 2), "8K0 907 115", fill=(0, 0, 0))
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=85)
+    return output.getvalue()
+
+
+class StandIns():
+    """
+    Content and behaviour of the fake Yahoo and Gemini endpoints, plus request counters.
+    """
+    def __init__(self, args):
+        self.args = args
+        self.base_url = None
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.random = random.Random(args.seed)
+        self.image = build_image()
+        self.layouts = []
+        for name in ['listing_layout1.html', 'listing_layout2.html']:
+            with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+                self.layouts.append(f.read())
+
+    def count(self, key):
+        with self.lock:
+            self.counts[key] += 1
+
+    def search_page(self, b):
+        first = b - 1
+        items = []
+        for i in range(first, min(first + LISTINGS_PER_PAGE, self.args.listings)):
+            aid = auction_id(i)
+            items.append(f'''<li class="Product">
+  <div class="Product__image"><a class="Product__imageLink" href="{self.base_url}/jp/auction/{aid}"><img class="Product__imageData" src="{self.base_url}/img/{aid}-0.jpg" width="130" height="130"></a></div>
+  <div class="Product__detail"><h3 class="Product__title"><a class="Product__titleLink" href="{self.base_url}/jp/auction/{aid}">アウディ A4 B8 純正 ECU {aid}</a></h3>
+  <div class="Product__priceInfo"><span class="Product__priceValue">12,000円</span></div></div>
+</li>''')
+        return f'''<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8"><title>「アウディ用」の検索結果 - Yahoo!オークション</title></head>
+<body><div class="Products Products--grid"><ul class="Products__items">
+{chr(10).join(items)}
+</ul></div></body></html>'''
+
+    def listing_page(self, aid):
+        # Alternate between the two layouts parse_images_from_page supports
+        layout = self.layouts[int(aid[1:]) % 2]
+        return layout.replace(FIXTURE_IMAGE_PREFIX, f"{self.base_url}/img/{aid}")
+
+    def gemini_answer(self, request):
+        """
+        Answer like the model would, based on which GeminiInference prompt was sent.
+        """
+        text = "\n".join(part.get('text', '') for content in request.get('contents', []) for part in content.get('parts', []))
+        if "<VALID>" in text:
+            self.count('gemini_validate')
+            return "<VALID>"
+        if "Your task is to identify the number" in text:
+            self.count('gemini_final_validate')
+            return f"<START>{self.args.answer}<END>"
+        with self.lock:
+            found = self.random.random() >= self.args.none_rate
+        number = self.args.answer if found else "NONE"
+        if "<IMAGE>" in text:
+            self.count('gemini_multi_image')
+            return f"<IMAGE> {1 if found else 0} </IMAGE> <START> {number} <END>"
+        self.count('gemini_main')
+        return f"<START> {number} <END>"
+
+
+def make_handler(stand_ins):
+    args = stand_ins.args
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *log_args):
+            pass
+
+        def send(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path == '/search':
+                stand_ins.count('search_page')
+                time.sleep(args.page_latency)
+                b = int(parse_qs(url.query).get('b', ['1'])[0])
+                self.send(200, stand_ins.search_page(b).encode('utf-8'), 'text/html; charset=utf-8')
+            elif url.path.startswith('/jp/auction/'):
+                stand_ins.count('listing_page')
+                time.sleep(args.page_latency)
+                self.send(200, stand_ins.listing_page(url.path.rsplit('/', 1)[-1]).encode('utf-8'), 'text/html; charset=utf-8')
+            elif url.path.startswith('/img/'):
+                stand_ins.count('image')
+                time.sleep(args.image_latency)
+                self.send(200, stand_ins.image, 'image/jpeg')
+            else:
+                self.send(404, b'', 'text/plain')
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if not re.search(r':generateContent$', urlsplit(self.path).path):
+                self.send(404, b'', 'text/plain')
+                return
+            stand_ins.count('gemini_call')
+            time.sleep(args.gemini_latency)
+            with stand_ins.lock:
+                rate_limited = stand_ins.random.random() < args.rate_429
+            if rate_limited:
+                stand_ins.count('gemini_429')
+                error = {"error": {"code": 429, "message": "Resource has been exhausted (e.g. check quota).", "status": "RESOURCE_EXHAUSTED"}}
+                self.send(429, json.dumps(error).encode('utf-8'), 'application/json')
+                return
+            answer = stand_ins.gemini_answer(json.loads(body))
+            response = {
+                "candidates": [{"content": {"parts": [{"text": answer}], "role": "model"}, "finishReason": "STOP", "index": 0}],
+                "usageMetadata": {"promptTokenCount": 600, "candidatesTokenCount": 20, "totalTokenCount": 620},
+            }
+            self.send(200, json.dumps(response).encode('utf-8'), 'application/json')
+
+    return Handler
+
+
+class UniformPicker():
+    """
+    Stands in for TargetModel without picker weights: images are downloaded and decoded
+    like in the real picker, then every image gets the same score.
+    """
+    def __init__(self):
+        from dataprocessor import Processor
+        self.processor = Processor(cfg.image_size, cfg.batch_size)
+
+    def do_inference_return_probs(self, image_links):
+        image_links, _ = self.processor.load_batch(image_links)
+        return [{'image_link': link, 'score': 1.0 / len(image_links)} for link in image_links]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of main.reduce")
+    parser.add_argument('--listings', type=int, default=100, help="Number of listings served by the fake search")
+    parser.add_argument('--concurrency', type=int, default=4, help="reduce() workers")
+    parser.add_argument('--crawl-concurrency', type=int, default=None, help="Search pages fetched at once")
+    parser.add_argument('--multi-image', type=int, default=0, help="reduce() multi_image (0 disables)")
+    parser.add_argument('--picker', type=str, default='uniform', choices=['uniform', 'keras', 'savedmodel', 'tflite'], help="Picker backend, 'uniform' needs no weights")
+    parser.add_argument('--picker-model-path', type=str, default=None)
+    parser.add_argument('--car-brand', type=str, default='audi')
+    parser.add_argument('--answer', type=str, default='8K0 907 115', help="Part number the fake Gemini reads")
+    parser.add_argument('--none-rate', type=float, default=0.3, help="Fraction of recognition answers that are NONE")
+    parser.add_argument('--gemini-latency', type=float, default=1.0, help="Seconds per fake Gemini call")
+    parser.add_argument('--rate-429', type=float, default=0.0, help="Fraction of fake Gemini calls answered with 429")
+    parser.add_argument('--page-latency', type=float, default=0.2, help="Seconds per search/listing page")
+    parser.add_argument('--image-latency', type=float, default=0.05, help="Seconds per image")
+    parser.add_argument('--api-keys', type=int, default=4, help="Number of fake API keys")
+    parser.add_argument('--requests-per-minute', type=int, default=600, help="Gemini requests per minute per key")
+    parser.add_argument('--key-cooldown', type=float, default=cfg.gemini_key_cooldown, help="Seconds a key answering 429 cools down")
+    parser.add_argument('--host-rate', type=float, default=50, help="Initial request rate allowed to the fake Yahoo host")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='end_to_end_')
+    stand_ins = StandIns(args)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(stand_ins))
+    server.daemon_threads = True
+    stand_ins.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # Point the pipeline at the stand-ins; caches go to a fresh directory so every run starts cold
+    cfg.auction_link_prefix = f"{stand_ins.base_url}/jp/auction/"
+    cfg.product_link_prefix = stand_ins.base_url
+    cfg.gemini_api_endpoint = stand_ins.base_url
+    cfg.image_cache_dir = os.path.join(workdir, 'image_cache')
+    cfg.gemini_key_cooldown = args.key_cooldown
+    cfg.http_host_limits = {**cfg.http_host_limits, '127.0.0.1': (args.host_rate, args.host_rate * 5, 64)}
+
+    import main as pipeline
+    from gemini_model import GeminiInference
+    from http_client import rate_metrics
+
+    latencies = []
+    latencies_lock = threading.Lock()
+    encode = pipeline.encode
+
+    def timed_encode(*encode_args, **encode_kwargs):
+        start = time.perf_counter()
+        try:
+            return encode(*encode_args, **encode_kwargs)
+        finally:
+            with latencies_lock:
+                latencies.append(time.perf_counter() - start)
+    pipeline.encode = timed_encode
+
+    if args.picker == 'uniform':
+        picker = UniformPicker()
+    else:
+        picker = pipeline.TargetModel(model_path=args.picker_model_path, backend=args.picker)
+    model = GeminiInference(api_keys=[f"fake-key-{i}" for i in range(args.api_keys)],
+                            model_name='gemini-1.5-flash',
+                            car_brand=args.car_brand,
+                            requests_per_minute=args.requests_per_minute,
+                            use_cache=False)
+
+    start = time.perf_counter()
+    result = pipeline.reduce(f"{stand_ins.base_url}/search?p=audi&b=1&n={LISTINGS_PER_PAGE}&s1=new&o1=d",
+                             picker=picker,
+                             model=model,
+                             ignore_error=True,
+                             max_steps=math.ceil(args.listings / LISTINGS_PER_PAGE),
+                             max_links=args.listings,
+                             savename=os.path.join(workdir, 'end_to_end'),
+                             concurrency=args.concurrency,
+                             multi_image=args.multi_image,
+                             crawl_concurrency=args.crawl_concurrency)
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    processed = len(result['url'])
+    recognized = sum(number not in ('NONE', 'none', 'ERROR', 'NO_IMAGES') for number in result['predicted_number'])
+    latencies = np.array(latencies)
+    counts = stand_ins.counts
+    print(f"Listings:          {processed} processed, {recognized} recognized in {elapsed:.1f}s")
+    print(f"Throughput:        {processed / elapsed * 60:.1f} listings/min")
+    if len(latencies):
+        print(f"Listing latency:   p50 {np.percentile(latencies, 50):.2f}s, p95 {np.percentile(latencies, 95):.2f}s")
+    print(f"Gemini calls:      {counts['gemini_call'] / max(processed, 1):.2f} per listing "
+          f"({counts['gemini_call']} total, {counts['gemini_429']} answered 429)")
+    print(f"  by prompt:       main {counts['gemini_main']}, multi-image {counts['gemini_multi_image']}, "
+          f"validate {counts['gemini_validate']}, final validate {counts['gemini_final_validate']}")
+    print(f"Yahoo requests:    {counts['search_page']} search pages, {counts['listing_page']} listing pages, {counts['image']} images")
+    print(f"Host rates:        {rate_metrics()}")
+    print(f"Run files:         {workdir}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark HTML extraction backends on saved search and listing pages.
+
+Reports parse + extraction time per page for every backend and checks that each
+backend returns the same products, image links and product info as bs4.
+
+Usage Example:
+
+    python benchmarks/html_parsing.py --pages benchmarks/fixtures/*.html page_dump.html --backends bs4 lxml selectolax
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_backends import load_html_backend
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def extract(backend, content):
+    tree = backend.parse(content)
+    return (backend.extract_products(tree),
+            backend.extract_image_links(tree),
+            backend.extract_product_info(tree))
+
+
+def run_backend(backend, pages, repeats):
+    timings = {}
+    for path, content in pages.items():
+        extract(backend, content)  # warm-up
+        latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            extract(backend, content)
+            latencies.append(time.perf_counter() - start)
+        timings[path] = np.array(latencies)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML extraction backends")
+    parser.add_argument('--pages', nargs='+', default=sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html'))), help="Saved search/listing pages")
+    parser.add_argument('--repeats', type=int, default=50, help="Parses per page and backend")
+    parser.add_argument('--backends', nargs='+', default=['bs4', 'lxml', 'selectolax'], help="Backends to compare with bs4")
+    args = parser.parse_args()
+
+    pages = {}
+    for path in args.pages:
+        with open(path, 'rb') as f:
+            pages[path] = f.read()
+    print(f"Loaded {len(pages)} pages, {sum(len(content) for content in pages.values()) / 1024:.0f} KB")
+
+    reference = None
+    reference_p50 = None
+    for name in ['bs4'] + [b for b in args.backends if b != 'bs4']:
+        backend = load_html_backend(name)
+        outputs = {path: extract(backend, content) for path, content in pages.items()}
+        if reference is None:
+            reference = outputs
+        mismatches = [os.path.basename(path) for path in pages if outputs[path] != reference[path]]
+
+        timings = run_backend(backend, pages, args.repeats)
+        p50 = np.mean([np.percentile(latencies, 50) for latencies in timings.values()])
+        reference_p50 = reference_p50 or p50
+        print(f"{name:>10}: {p50 * 1000:7.2f} ms/page (p50), {reference_p50 / p50:5.1f}x vs bs4, "
+              f"output {'identical' if not mismatches else 'differs on ' + ', '.join(mismatches)}")
+        for path, latencies in timings.items():
+            print(f"{'':>12}{os.path.basename(path):<28} p50 {np.percentile(latencies, 50) * 1000:7.2f} ms, "
+                  f"p95 {np.percentile(latencies, 95) * 1000:7.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
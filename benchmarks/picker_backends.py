@@ -0,0 +1,77 @@
+"""
+Benchmark picker inference backends against the Keras model.
+
+Reports per-listing latency, image throughput and how often each backend picks
+the same top-1 image as Keras.
+
+Usage Example:
+
+    python benchmarks/picker_backends.py --dataset dataset_folder --backends keras savedmodel tflite
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config as cfg
+from dataprocessor import Processor
+from export_picker import read_listings
+from picker_model import load_backend
+
+
+def load_listings(dataset_folder, limit):
+    processor = Processor(cfg.image_size, cfg.batch_size)
+    listings = []
+    for image_links in read_listings(dataset_folder)[:limit]:
+        _, images = processor.load_batch(image_links)
+        if len(images):
+            listings.append(images)
+    return listings
+
+
+def run_backend(backend, listings, repeats):
+    backend.predict(listings[0])  # warm-up
+    latencies, top1 = [], []
+    for _ in range(repeats):
+        for images in listings:
+            start = time.perf_counter()
+            backend.predict(images)
+            latencies.append(time.perf_counter() - start)
+    top1 = [int(np.argmax(backend.predict(images).flatten())) for images in listings]
+    return np.array(latencies), top1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark picker inference backends")
+    parser.add_argument('--dataset', type=str, required=True, help="Folder of collect_data.py JSON files, one listing per file")
+    parser.add_argument('--limit', type=int, default=50, help="Number of listings to benchmark on")
+    parser.add_argument('--repeats', type=int, default=3, help="Passes over all listings per backend")
+    parser.add_argument('--backends', nargs='+', default=['keras', 'tflite'], help="Backends to compare with keras")
+    parser.add_argument('--keras-path', type=str, default=None)
+    parser.add_argument('--savedmodel-path', type=str, default=None)
+    parser.add_argument('--tflite-path', type=str, default=None)
+    args = parser.parse_args()
+
+    listings = load_listings(args.dataset, args.limit)
+    num_images = sum(len(images) for images in listings)
+    print(f"Loaded {len(listings)} listings, {num_images} images")
+
+    paths = {'keras': args.keras_path, 'savedmodel': args.savedmodel_path, 'tflite': args.tflite_path}
+    reference = None
+    for name in ['keras'] + [b for b in args.backends if b != 'keras']:
+        latencies, top1 = run_backend(load_backend(name, paths[name]), listings, args.repeats)
+        if reference is None:
+            reference = top1
+        agreement = np.mean([a == b for a, b in zip(top1, reference)])
+        print(f"{name:>10}: p50 {np.percentile(latencies, 50) * 1000:7.1f} ms/listing, "
+              f"p95 {np.percentile(latencies, 95) * 1000:7.1f} ms/listing, "
+              f"{num_images * args.repeats / latencies.sum():7.1f} images/s, "
+              f"top-1 agreement with keras {agreement:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark reduced-size JPEG decoding and lower picker resolutions.
+
+Compares decode+resize time per image and top-1 image agreement with the
+reference picker (full decode at Config.image_size).
+
+Usage Example:
+
+    python benchmarks/picker_resolution.py --dataset dataset_folder --sizes 512 320 256
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config as cfg
+from dataprocessor import load_array
+from export_picker import read_listings
+from image_cache import fetch_image
+from picker_model import KerasBackend
+
+
+def preprocess_listings(listings, image_size, draft):
+    """
+    Decode every listing at one resolution and return (arrays, seconds per image).
+    """
+    arrays, elapsed, count = [], 0.0, 0
+    for image_links in listings:
+        images = []
+        for link in image_links:
+            start = time.perf_counter()
+            img = load_array(link, image_size=image_size, draft=draft)
+            elapsed += time.perf_counter() - start
+            count += 1
+            if img is not None:
+                images.append(img)
+        arrays.append(np.stack(images) if images else None)
+    return arrays, elapsed / max(count, 1)
+
+
+def top1(backend, arrays):
+    return [None if images is None else int(np.argmax(backend.predict(images).flatten())) for images in arrays]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JPEG draft decoding and picker resolution")
+    parser.add_argument('--dataset', type=str, required=True, help="Folder of collect_data.py JSON files, one listing per file")
+    parser.add_argument('--limit', type=int, default=50, help="Number of listings to benchmark on")
+    parser.add_argument('--sizes', nargs='+', type=int, default=[512, 320, 256], help="Picker resolutions to compare")
+    parser.add_argument('--weights', type=str, default=cfg.model_path)
+    args = parser.parse_args()
+
+    listings = read_listings(args.dataset)[:args.limit]
+    # Download everything up front so only decoding is timed
+    for image_links in listings:
+        for link in image_links:
+            try:
+                fetch_image(link)
+            except Exception as e:
+                print(f"Failed to fetch {link}: {e}")
+
+    reference_arrays, reference_time = preprocess_listings(listings, cfg.image_size, draft=False)
+    reference = top1(KerasBackend(args.weights, cfg.image_size), reference_arrays)
+    print(f"reference {cfg.image_size[0]}px full decode: {reference_time * 1000:6.1f} ms/image")
+
+    for size in args.sizes:
+        image_size = (size, size)
+        backend = KerasBackend(args.weights, image_size)
+        for draft in [False, True]:
+            arrays, decode_time = preprocess_listings(listings, image_size, draft)
+            start = time.perf_counter()
+            picks = top1(backend, arrays)
+            picker_time = time.perf_counter() - start
+            agreement = np.mean([a == b for a, b in zip(picks, reference) if b is not None])
+            print(f"{size:4d}px {'draft' if draft else 'full ':>5} decode: {decode_time * 1000:6.1f} ms/image, "
+                  f"picker {picker_time / len(listings) * 1000:7.1f} ms/listing, "
+                  f"top-1 agreement {agreement:.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,75 @@
-from picker_model import TargetModel 
+from dataprocessor import auction_id_from_link
+from config import Config as cfg
 
 import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import json 
 import os 
 
-def collect_links(t, first_page_link, max_pages=3, max_links=90, offset=0, verbose=0) -> list:
+def collect_page_links(processor, page_link, index=None):
+    # Extract links for Yahoo Auctions product pages
+    links = [link for _, link in processor.get_page_content(page_link) if link.startswith(cfg.auction_link_prefix)]
+    # Auctions already in the shared index are not scheduled again
+    return index.filter_new(links, auction_id_from_link) if index is not None else links
+
+def collect_links(processor, first_page_link, max_pages=3, max_links=90, offset=0, verbose=0, concurrency=None, index=None) -> list:
+    # Construct the URL for each page by updating the 'b' parameter
+    page_links = iter([first_page_link.replace('b=1', f'b={1 + (i + offset) * 100}') for i in range(max_pages)])
+
+    # Up to `concurrency` search pages are fetched at once (the host politeness limit in
+    # http_client still applies); results are consumed in page order.
     products_links = list()
-    for i in range(max_pages):
-        page_num = i + 1 + offset
-        # Construct the URL for each page by updating the 'b' parameter
-        main_link = first_page_link.replace('b=1', f'b={1 + (page_num - 1) * 100}')
-        
-        # Extract links for Yahoo Auctions product pages
-        pages = [link for _, link in t.processor.get_page_content(main_link) if link.startswith("https://page.auctions.yahoo.co.jp/jp/auction/")]
-        
-        if verbose:
-            print('\n'.join(pages))
-        
-        products_links.extend(pages)
-        
-        # Stop if we've reached the maximum number of links
-        if len(products_links) >= max_links:
-            break
+    with ThreadPoolExecutor(max_workers=concurrency or cfg.crawl_concurrency) as executor:
+        in_flight = deque(executor.submit(collect_page_links, processor, page_link, index)
+                          for _, page_link in zip(range(concurrency or cfg.crawl_concurrency), page_links))
+        while in_flight:
+            pages = in_flight.popleft().result()
+            
+            if verbose:
+                print('\n'.join(pages))
+            
+            products_links.extend(pages)
+            
+            # Stop if we've reached the maximum number of links
+            if len(products_links) >= max_links:
+                for future in in_flight:
+                    future.cancel()
+                break
+
+            page_link = next(page_links, None)
+            if page_link is not None:
+                in_flight.append(executor.submit(collect_page_links, processor, page_link, index))
     
     return products_links[:max_links]
 
 
+def collect_new_links(processor, first_page_link, seen_ids, max_pages=3, max_links=90, index=None) -> list:
+    """
+    Collect links of auctions not in seen_ids (or in the shared index) from a newest-first search.
+
+    Pages are fetched one by one and paging stops at the first page that contains an
+    already seen auction, since everything after it is older.
+    """
+    def is_seen(link):
+        auction_id = auction_id_from_link(link)
+        return auction_id in seen_ids or (index is not None and auction_id in index)
+
+    if index is not None:
+        index.refresh()
+    new_links = list()
+    for i in range(max_pages):
+        page_links = collect_page_links(processor, first_page_link.replace('b=1', f'b={1 + i * 100}'))
+        seen = [is_seen(link) for link in page_links]
+        new_links.extend(link for link, link_seen in zip(page_links, seen) if not link_seen and link not in new_links)
+
+        if len(new_links) >= max_links or any(seen):
+            break
+
+    return new_links[:max_links]
+
+
 def encode_images(t, page_link): 
   image_links = t.processor.parse_images_from_page(page_link)
   image_links = list(set(image_links))
@@ -58,9 +101,10 @@ def map_fn(t, target_folder, page_link):
 
 
 def main(main_page_link, target_folder_name) -> None : 
+  from picker_model import TargetModel
   t = TargetModel()
 
-  products_links = collect_links(t, main_page_link) 
+  products_links = collect_links(t.processor, main_page_link) 
   
   # remove duplicates 
   products_links = list(set(products_links))
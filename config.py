@@ -5,12 +5,88 @@ class Config():
 
   mainpage_url = "https://auctions.yahoo.co.jp/category/list/2084017107/?p=アウディ用&auccat=2084017107&istatus=2%2C1&is_postage_mode=0&dest_pref_code=13&exflg=1&b=1&n=100&s1=new&o1=d&brand_id=118482"
   model_path = 'checkpoint.weights.h5'
+  # Only search results linking here are collected as listings
+  auction_link_prefix = "https://page.auctions.yahoo.co.jp/jp/auction/"
+
+  # Picker inference backend: 'keras' (model_path), 'savedmodel' or 'tflite' (see export_picker.py)
+  picker_backend = 'keras'
+  savedmodel_path = 'picker_savedmodel'
+  tflite_model_path = 'picker.tflite'
 
   image_size = (512, 512)
+  # Decode JPEGs at a reduced scale close to the picker resolution instead of full size
+  jpeg_draft_decode = True
   image_channels = 3
   image_shape = (*image_size, image_channels)
 
   batch_size = 32
+  # Longest time the picker waits for images of other listings to fill a batch; a lone listing never waits
+  batch_max_wait = 0.05
+
+  # Shared HTTP client: keep-alive pools per host, (connect, read) timeouts and retries on connection errors/5xx
+  http_pool_hosts = 16
+  http_pool_size = 16
+  http_host_pool_sizes = {
+      'https://auctions.yahoo.co.jp': 8,
+      'https://page.auctions.yahoo.co.jp': 16,
+      'https://auctions.c.yimg.jp': 32,
+  }
+  http_connect_timeout = 5
+  http_read_timeout = 15
+  http_retries = 3
+  http_backoff_factor = 0.5
+  # Adaptive per-host rate limits as (initial requests per second, max requests per second, max requests in flight)
+  http_host_limits = {
+      'auctions.yahoo.co.jp': (2, 10, 4),
+      'page.auctions.yahoo.co.jp': (4, 20, 8),
+  }
+  http_default_host_limit = (20, 100, 32)
+  # AIMD: +http_rate_increase requests/s per fast success, x http_rate_decrease on 429/503, errors or slow answers
+  http_rate_increase = 0.1
+  http_rate_decrease = 0.5
+  http_min_rate = 0.2
+  http_decrease_interval = 2
+  http_latency_target = 5
+
+  # Search result pages fetched at once by collect_links
+  crawl_concurrency = 4
+  # Shared index of processed auction IDs (see auction_index.py); claims older than the timeout are taken over
+  auction_index_path = 'auction_index.sqlite'
+  auction_index_claim_timeout = 3600
+  auction_index_bloom_capacity = 1_000_000
+  auction_index_bloom_error_rate = 0.001
+
+  # Seconds between polls of the first search page in main.py --watch mode
+  watch_interval = 300
+
+  # HTML extraction backend used by Processor: 'bs4', 'lxml' or 'selectolax' (see html_backends.py)
+  html_backend = 'lxml'
+  # Search result items only count product links and images starting with this prefix
+  product_link_prefix = "https://"
+
+  # Parallel image download/decode used when building the picker input
+  image_fetch_workers = 8
+  image_fetch_timeout = 10
+
+  # Shared on-disk image cache (picker, Gemini and verification paths)
+  image_cache_dir = 'image_cache'
+  image_cache_max_bytes = 2 * 1024 ** 3
+
+  # Per API key Gemini quota; keys answering 429 cool down for gemini_key_cooldown seconds (doubling on repeats)
+  gemini_requests_per_minute = 15
+  gemini_tokens_per_minute = 1_000_000
+  gemini_key_cooldown = 60
+  # Gemini API endpoint override, None for the public API
+  gemini_api_endpoint = None
+
+  # Images are downscaled to this longest side and re-encoded to JPEG before upload to Gemini
+  gemini_upload_max_side = 1536
+  gemini_upload_jpeg_quality = 90
+
+  # Persistent cache of recognized numbers keyed by image hash, model and prompt
+  recognition_cache_path = 'recognition_cache.sqlite'
+  recognition_cache_ttl = 30 * 24 * 3600
+  recognition_cache_max_entries = 100_000
 
 class Logs():
   runtimes = ''
@@ -1,29 +1,33 @@
 import logging
 from config import Config as cfg 
 from config import RuntimeMeta
+from image_cache import fetch_image
+from http_client import get_session
+import http_client
+from html_backends import load_html_backend
 
-import tensorflow as tf
 import numpy as np
-from tensorflow.data import Dataset
 
 import requests
 from PIL import Image
 from io import BytesIO
-from bs4 import BeautifulSoup
-import time
 import random
 import re
+from concurrent.futures import ThreadPoolExecutor
 from requests.exceptions import RequestException, ProxyError
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def load_image(image_link):
+def load_image(image_link, timeout=None, draft_size=None):
     """
     Load an image from a given link or file path.
     
     Args:
         image_link (str or np.ndarray): The image source (URL, file path, or numpy array).
+        timeout (float): Timeout in seconds for remote images (default is cfg.image_fetch_timeout).
+        draft_size (tuple): If given, JPEGs are decoded at the smallest 1/2, 1/4 or 1/8 scale
+            that still covers this size instead of at full resolution.
     
     Returns:
         PIL.Image.Image or None: The loaded image, or None if loading fails.
@@ -31,11 +35,7 @@ def load_image(image_link):
     if type(image_link) == str:
         if image_link.startswith("http"):
             try:
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36'
-                }
-                response = requests.get(image_link, headers=headers)
-                img = Image.open(BytesIO(response.content))
+                img = Image.open(BytesIO(fetch_image(image_link, timeout=timeout)))
             except Exception as e:
                 print(image_link)
                 print(e)
@@ -47,22 +47,36 @@ def load_image(image_link):
     else:
         raise Exception("Unknown image type")
 
+    if draft_size is not None and img.format == 'JPEG':
+        img.draft('RGB', draft_size)
+
     if img.mode != 'RGB':
         img = img.convert('RGB')
     return img
 
-def encode_image(img):
+def resize_image(img, image_size=None):
     """
-    Encode and normalize an image for model input.
+    Resize an image to the model input size.
     
     Args:
         img (PIL.Image.Image): The input image.
+        image_size (tuple): Target (width, height) (default is cfg.image_size).
     
     Returns:
-        np.ndarray: The encoded and normalized image array.
+        np.ndarray: The resized uint8 image array of shape (H, W, C).
+    """
+    return np.asarray(img.resize(image_size or cfg.image_size), dtype=np.uint8)
+
+def normalize_image(img):
+    """
+    Normalize a uint8 image array to float32 values in [0, 1].
+    
+    Args:
+        img (np.ndarray): The uint8 image array.
+    
+    Returns:
+        np.ndarray: The normalized image array.
     """
-    img = img.resize(cfg.image_size)
-    img = np.array(img)
     img = img.astype('float32')
     
     # Add a small epsilon to avoid division by zero
@@ -74,33 +88,83 @@ def encode_image(img):
     
     return img
 
-def load_data(image_link):
+def encode_image(img, image_size=None):
+    """
+    Encode and normalize an image for model input.
+    
+    Args:
+        img (PIL.Image.Image): The input image.
+        image_size (tuple): Target (width, height) (default is cfg.image_size).
+    
+    Returns:
+        np.ndarray: The encoded and normalized image array.
+    """
+    return normalize_image(resize_image(img, image_size))
+
+def load_array(image_link, timeout=None, image_size=None, draft=None, out=None):
+    """
+    Load and resize an image from a given link into a uint8 NumPy array.
+    
+    Args:
+        image_link (str): The URL or file path of the image.
+        timeout (float): Timeout in seconds for remote images.
+        image_size (tuple): Target (width, height) (default is cfg.image_size).
+        draft (bool): Use reduced-size JPEG decoding (default is cfg.jpeg_draft_decode).
+        out (np.ndarray): Optional preallocated (H, W, C) uint8 slot to write the image into.
+    
+    Returns:
+        np.ndarray or None: The uint8 image array, or None if loading fails.
+    """
+    image_size = image_size or cfg.image_size
+    draft = cfg.jpeg_draft_decode if draft is None else draft
+    img = load_image(image_link, timeout=timeout, draft_size=image_size if draft else None)
+    if img is None:
+        return None
+    img = resize_image(img, image_size)
+    if out is None:
+        return img
+    np.copyto(out, img)
+    return out
+
+def load_data(image_link, timeout=None):
     """
     Load and preprocess an image from a given link.
     
     Args:
         image_link (str): The URL or file path of the image.
+        timeout (float): Timeout in seconds for remote images.
     
     Returns:
         tf.Tensor or None: The preprocessed image tensor, or None if loading fails.
     """
-    img = load_image(image_link)
+    img = load_array(image_link, timeout=timeout)
     if img is None:
         return None
-    img = encode_image(img)
+    img = normalize_image(img)
 
     # convert data to tf.tensor
+    import tensorflow as tf
     img = tf.convert_to_tensor(img)
     return img
 
+def auction_id_from_link(link):
+    """
+    Return the auction ID of a listing URL, e.g. 'x1234567890' for
+    https://page.auctions.yahoo.co.jp/jp/auction/x1234567890, or None if there is none.
+    """
+    match = re.search(r'/auction/([A-Za-z0-9]+)', link)
+    return match.group(1) if match else None
+
 class Processor(metaclass=RuntimeMeta):
     """
     A class for processing web pages and images for model input.
     """
-    def __init__(self, image_size, batch_size):
+    def __init__(self, image_size, batch_size, fetch_workers=None, html_backend=None):
         self.image_size = image_size
         self.batch_size = batch_size
-        self.session = requests.Session()
+        self.fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers or cfg.image_fetch_workers)
+        self.session = get_session()
+        self.html = load_html_backend(html_backend or cfg.html_backend, cfg.product_link_prefix)
         self.user_agents = self.generate_similar_user_agents()
         self.headers_list = self.generate_headers_list()
         self.proxies = [
@@ -182,29 +246,18 @@ class Processor(metaclass=RuntimeMeta):
             headers['User-Agent'] = random.choice(self.user_agents)  # Use the new method here
             
             try:
-                delay = (2 ** attempt) + random.random()
-                time.sleep(delay)
-                
-                response = self.session.get(url, headers=headers, timeout=10)
+                # Pacing and backoff come from the adaptive rate controller of the host
+                response = http_client.get(url, headers=headers)
                 response.raise_for_status()
                 
-                soup = BeautifulSoup(response.content, 'html.parser')
+                products = self.html.extract_products(self.html.parse(response.content))
                 
-                # Try different selectors to find product items
-                product_items = (
-                    soup.select('li.Product') or
-                    soup.select('div.ProductTile') or
-                    soup.select('div[class*="product"]')
-                )
-                
-                if not product_items:
+                if not products:
                     logging.warning("No product items found on the page.")
                 
-                for item in product_items:
-                    link = item.select_one('a[href^="https://"]')
-                    img = item.select_one('img[src^="https://"]')
+                for img, link in products:
                     if link and img:
-                        yield img.get('src'), link.get('href')
+                        yield img, link
                     else:
                         logging.warning(f"Found incomplete product item: link={link}, img={img}")
                 
@@ -218,60 +271,47 @@ class Processor(metaclass=RuntimeMeta):
                     logging.error(f"Failed to retrieve the webpage after {max_retries} attempts: {e}")
                     return
 
-    def parse_images_from_page(self, page_url, max_retries=5):
+    def fetch_page(self, page_url, max_retries=5):
         """
-        Extract image links from a given page URL, handling different layouts.
+        Download a listing page.
 
         Args:
-            page_url (str): The URL of the page to parse.
+            page_url (str): The URL of the page.
+            max_retries (int): Maximum number of retry attempts.
 
         Returns:
-            list: A list of unique image URLs found, or an empty list if no images are found.
+            bytes or None: The page content, or None if every attempt failed.
         """
-        logging.info(f"Parsing images from page: {page_url}")
-
         for attempt in range(max_retries):
             headers = random.choice(self.headers_list)
 
             try:
-                time.sleep(random.uniform(1, 2))
-                response = self.session.get(page_url, headers=headers, timeout=15)
+                # Pacing and backoff come from the adaptive rate controller of the host
+                response = http_client.get(page_url, headers=headers)
                 response.raise_for_status()
-                break
+                return response.content
             except requests.RequestException as e:
                 logging.error(f"Attempt {attempt + 1}/{max_retries} failed: {e}")
                 logging.error(f"Headers used: {headers}")
-                if attempt < max_retries - 1:
-                    wait_time = (2 ** attempt) + random.random()
-                    logging.warning(f"Request failed. Retrying in {wait_time:.2f} seconds...")
-                    time.sleep(wait_time)
-                else:
+                if attempt == max_retries - 1:
                     logging.error(f"Failed to retrieve the webpage after {max_retries} attempts: {e}")
-                    return []
-
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        image_links = []
+        return None
 
-        # --- Layout 1: Try to find images using ProductImage__images class ---
-        image_container_layout1 = soup.find('ul', class_='ProductImage__images')
-        if image_container_layout1:
-            logging.info("Parsing page with ProductImage__images structure (Layout 1)")
-            image_tags = image_container_layout1.find_all('img')
-            image_links.extend([img.get('src') or img.get('data-src') for img in image_tags if img.get('src') or img.get('data-src')])
-            return image_links  # Return if Layout 1 found
+    def extract_image_links(self, content, tree=None):
+        """
+        Extract image links from a listing page, handling different layouts
+        (ul.ProductImage__images, then the div.ivcsLx slick-slider).
 
-        # --- Layout 2: If ProductImage__images not found, try slick-slider (ivcsLx) ---
-        image_slider_layout2 = soup.find('div', class_='ivcsLx')
-        if image_slider_layout2:
-            logging.info("Parsing page with slick-slider structure (Layout 2)")
-            image_tags = image_slider_layout2.find_all('img', class_='xzFse')
-            image_links.extend([img.get('src') or img.get('data-src') for img in image_tags if img.get('src') or img.get('data-src')])
-            return image_links  # Return if Layout 2 found
+        Args:
+            content (bytes): The page content.
+            tree: The page already parsed by self.html, if available.
 
-        logging.warning("No known image container structure found on the page.")
+        Returns:
+            list: A list of unique image URLs found, or an empty list if no images are found.
+        """
+        image_links = self.html.extract_image_links(tree if tree is not None else self.html.parse(content))
 
-        # Process and clean up image links (moved outside layout checks, will run if links are found in either layout)
+        # Process and clean up image links
         cleaned_links = []
         for src in image_links:
             if src.startswith('//'):
@@ -280,17 +320,67 @@ class Processor(metaclass=RuntimeMeta):
                 src = 'https://auctions.yahoo.co.jp' + src
             cleaned_links.append(src)
 
-        unique_links = list(set(cleaned_links))
+        unique_links = list(dict.fromkeys(cleaned_links))
         logging.info(f"Found {len(unique_links)} unique image links")
 
         if not unique_links:
             logging.warning("No images found. Dumping HTML for inspection.")
-            with open('page_dump.html', 'w', encoding='utf-8') as f:
-                f.write(soup.prettify())
+            with open('page_dump.html', 'wb') as f:
+                f.write(content)
             logging.warning("HTML dumped to page_dump.html")
 
         return unique_links
 
+    def extract_product_info(self, content, tree=None):
+        """
+        Extract the title and price from a listing page.
+
+        Returns:
+            dict: A dictionary with 'title' and 'price', 'N/A' for fields that are missing.
+        """
+        return self.html.extract_product_info(tree if tree is not None else self.html.parse(content))
+
+    def load_listing(self, url):
+        """
+        Fetch a listing page once and parse everything needed from it.
+
+        Args:
+            url (str): The URL of the listing page.
+
+        Returns:
+            dict or None: A listing record with 'url', 'auction_id', 'title', 'price' and
+                'image_links', or None if the page could not be downloaded.
+        """
+        logging.info(f"Loading listing: {url}")
+        content = self.fetch_page(url)
+        if content is None:
+            return None
+
+        tree = self.html.parse(content)
+        return {
+            'url': url,
+            'auction_id': auction_id_from_link(url),
+            **self.extract_product_info(content, tree),
+            'image_links': self.extract_image_links(content, tree),
+        }
+
+    def parse_images_from_page(self, page_url, max_retries=5):
+        """
+        Extract image links from a given page URL, handling different layouts.
+
+        Args:
+            page_url (str): The URL of the page to parse.
+
+        Returns:
+            list: A list of unique image URLs found, or an empty list if no images are found.
+        """
+        logging.info(f"Parsing images from page: {page_url}")
+
+        content = self.fetch_page(page_url, max_retries)
+        if content is None:
+            return []
+        return self.extract_image_links(content)
+
     def load_product_info(self, url):
         """
         Load product information from a given URL.
@@ -301,16 +391,48 @@ class Processor(metaclass=RuntimeMeta):
         Returns:
             dict: A dictionary containing product information (e.g., price).
         """
-        response = requests.get(url)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'html.parser')
-            return_data = {}
-            # Extract the price information from the product page
-            price_elem = soup.find('dd', class_='Price__value')
-            return_data['price'] = price_elem.text.strip() if price_elem else 'N/A'
-            return return_data
-        else:
-            print(f'Failed to retrieve the webpage. Status code: {response.status_code}')
+        content = self.fetch_page(url)
+        if content is None:
+            print(f'Failed to retrieve the webpage: {url}')
+            return None
+        return self.extract_product_info(content)
+
+    def load_images(self, image_links):
+        """
+        Download and preprocess images in parallel.
+        
+        Args:
+            image_links (list): A list of image URLs or file paths.
+        
+        Returns:
+            list: Preprocessed image tensors in the order of image_links, None for images that failed to load.
+        """
+        images = list(self.fetch_pool.map(load_data, image_links))
+        logging.info(f"Loaded {sum(img is not None for img in images)}/{len(image_links)} images")
+        return images
+
+    def load_batch(self, image_links):
+        """
+        Download and decode images in parallel straight into one preallocated uint8 batch.
+        Normalization happens inside the picker graph.
+        
+        Args:
+            image_links (list): A list of image URLs or file paths.
+        
+        Returns:
+            tuple: (loaded_links, images) where images is a uint8 array of shape (len(loaded_links), H, W, C).
+                Links whose image failed to load are left out.
+        """
+        images = np.empty((len(image_links), *self.image_size[::-1], cfg.image_channels), dtype=np.uint8)
+
+        def load_into(i):
+            return load_array(image_links[i], image_size=self.image_size, out=images[i]) is not None
+
+        loaded = np.array(list(self.fetch_pool.map(load_into, range(len(image_links)))), dtype=bool)
+        logging.info(f"Loaded {loaded.sum()}/{len(image_links)} images")
+        if not loaded.all():
+            images = images[loaded]
+        return [link for link, ok in zip(image_links, loaded) if ok], images
 
     def build_dataset(self, image_links):
         """
@@ -322,13 +444,11 @@ class Processor(metaclass=RuntimeMeta):
         Returns:
             tf.data.Dataset: A TensorFlow dataset containing the processed images.
         """
-        images = []
-        for i, image_link in enumerate(image_links):
-            img = load_data(image_link)
-            if img is not None:
-                images.append(img)
-            if (i + 1) % 10 == 0:
-                logging.info(f"Processed {i + 1}/{len(image_links)} images")
+        # TensorFlow is only needed by the picker, scraping works without it
+        import tensorflow as tf
+        from tensorflow.data import Dataset
+
+        images = [img for img in self.load_images(image_links) if img is not None]
 
         if not images:
             logging.warning("No valid images found. Returning empty dataset.")
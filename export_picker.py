@@ -0,0 +1,115 @@
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+
+import numpy as np
+import tensorflow as tf
+
+from config import Config as cfg
+from dataprocessor import load_array, normalize_image
+from picker_model import build_model, with_uint8_input
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def read_listings(dataset_folder):
+    """
+    Read a folder of collect_data.py JSON files.
+
+    Returns:
+        list: One list of image links per listing.
+    """
+    listings = []
+    for root, dirs, files in os.walk(dataset_folder):
+        for file in sorted(files):
+            if file.endswith('.json'):
+                with open(os.path.join(root, file), 'r') as f:
+                    listings.append(list(json.load(f).keys()))
+    return listings
+
+
+def representative_dataset(image_links, num_images, image_size=None):
+    """
+    Yield calibration images for full int8 quantization.
+    """
+    links = random.sample(image_links, min(num_images, len(image_links)))
+
+    def generator():
+        for link in links:
+            img = load_array(link, image_size=image_size)
+            if img is not None:
+                yield [normalize_image(img)[np.newaxis]]
+    return generator
+
+
+def load_picker(weights_path, image_size=None):
+    model = build_model(1, weights=None, image_size=image_size)
+    model.load_weights(weights_path)
+    return model
+
+
+def save_model(model, path):
+    if hasattr(model, 'export'):
+        model.export(path)
+    else:
+        tf.saved_model.save(model, path)
+
+
+def export_saved_model(weights_path, saved_model_path, image_size=None):
+    # The SavedModel takes uint8 images and normalizes them in the graph, like the Keras backend
+    save_model(with_uint8_input(load_picker(weights_path, image_size)), saved_model_path)
+    logging.info(f"SavedModel written to {saved_model_path}")
+
+
+def export_tflite(weights_path, tflite_path, quantize='none', calibration_links=None, calibration_images=100, image_size=None):
+    # TFLite is converted from the float-input graph so int8 calibration sees normalized images
+    with tempfile.TemporaryDirectory() as float_saved_model_path:
+        save_model(load_picker(weights_path, image_size), float_saved_model_path)
+        converter = tf.lite.TFLiteConverter.from_saved_model(float_saved_model_path)
+
+        if quantize in ['dynamic', 'int8']:
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if quantize == 'int8':
+            assert calibration_links, "int8 quantization needs calibration images (--calibration-dataset)"
+            converter.representative_dataset = representative_dataset(calibration_links, calibration_images, image_size)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8, tf.lite.OpsSet.TFLITE_BUILTINS]
+
+        tflite_model = converter.convert()
+
+    with open(tflite_path, 'wb') as f:
+        f.write(tflite_model)
+    logging.info(f"TFLite model ({quantize} quantization) written to {tflite_path}: {os.path.getsize(tflite_path) / 1024 ** 2:.1f} MB")
+
+
+def parse_args():
+    """
+    Main usage Example:
+
+        python export_picker.py --quantize int8 --calibration-dataset dataset_folder
+
+    """
+    parser = argparse.ArgumentParser(description="Export the picker checkpoint to SavedModel and TFLite")
+
+    parser.add_argument('--weights', type=str, default=cfg.model_path, help="Keras checkpoint to export")
+    parser.add_argument('--saved-model', type=str, default=cfg.savedmodel_path, help="Output SavedModel directory")
+    parser.add_argument('--tflite', type=str, default=cfg.tflite_model_path, help="Output TFLite file (pass '' to skip)")
+    parser.add_argument('--quantize', type=str, default='none', choices=['none', 'dynamic', 'int8'], help="TFLite quantization mode")
+    parser.add_argument('--calibration-dataset', type=str, default=None, help="Folder of collect_data.py JSON files used to calibrate int8 quantization")
+    parser.add_argument('--image-size', type=int, default=None, help="Picker input resolution, e.g. 256 or 320 (default is Config.image_size)")
+    parser.add_argument('--calibration-images', type=int, default=100, help="Number of calibration images")
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    image_size = (args.image_size, args.image_size) if args.image_size else None
+    export_saved_model(args.weights, args.saved_model, image_size)
+    if args.tflite:
+        calibration_links = [link for listing in read_listings(args.calibration_dataset) for link in listing] if args.calibration_dataset else None
+        export_tflite(args.weights, args.tflite, args.quantize, calibration_links, args.calibration_images, image_size)
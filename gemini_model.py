@@ -2,16 +2,25 @@
 
 import google.generativeai as genai
 from pathlib import Path
-from time import sleep
-import random
 import logging
-import time
 import json
 import os
 from PIL import Image
-import requests
 import re
 import io
+import copy
+import hashlib
+import threading
+
+from google.api_core import exceptions as google_exceptions
+from google.generativeai import client as genai_client
+
+from config import Config as cfg
+from image_cache import fetch_image
+from image_upload import prepared_image
+from key_pool import ApiKeyPool
+from part_formats import PartNumberMatcher
+from recognition_cache import RecognitionCache
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -66,17 +75,91 @@ If there are multiple numbers in the image, please identify the one that is most
 - If no valid number is identified: `<START> NONE <END>`
 """
 
+MULTI_IMAGE_PROMPT = """You are given {num_images} photos of the same listing, numbered 1 to {num_images}.
+Find the photo where the part number sticker is most clearly visible and read the part number from it.
+
+**Response Format:**
+- If a part number is identified: `<IMAGE> [photo number] </IMAGE> <START> [Part Number] <END>`
+- If no photo shows a valid number: `<IMAGE> 0 </IMAGE> <START> NONE <END>`
+"""
+
+
+def bind_to_configured_client(models):
+  """
+  Pin models to the client of the current genai.configure() call.
+
+  google-generativeai has no public way to give a GenerativeModel its own client: the
+  model looks up the process-wide default client on its first request. Setting the
+  private _client attribute is the only way to keep one client per API key, so this
+  relies on the google-generativeai version pinned in requirements.txt.
+  """
+  client = genai_client.get_default_generative_client()
+  for model in models:
+    model._client = client
+
 
 class GeminiInference():
-  def __init__(self, api_keys, model_name='gemini-1.5-flash', car_brand=None):
+  def __init__(self, api_keys, model_name='gemini-1.5-flash', car_brand=None,
+               requests_per_minute=None, tokens_per_minute=None, use_cache=True, api_endpoint=None):
     self.api_keys = api_keys
-    self.current_key_index = 0
+    self.model_name = model_name
+    # A custom endpoint (e.g. the local stand-in of benchmarks/end_to_end.py) is reached over REST
+    self.api_endpoint = api_endpoint or cfg.gemini_api_endpoint
     self.car_brand = car_brand.lower() if car_brand else None
     self.prompts = self.load_prompts()
     with open("formats.json", "r") as file:
       self.formats = json.load(file)
+    self.matcher = PartNumberMatcher(self.formats, self.car_brand)
+
+    self.system_prompt = self.prompts.get(self.car_brand, {}).get('main_prompt', DEFAULT_PROMPT)
 
-    self.configure_api()
+    # Results are cached per (image, model, prompts), so relisted photos cost no API calls
+    self.recognition_cache = RecognitionCache() if use_cache else None
+    validation_prompt = self.prompts.get(self.car_brand, {}).get('validation_prompt', "")
+    self.prompt_hash = hashlib.sha256(f"{self.system_prompt}\n{validation_prompt}".encode('utf-8')).hexdigest()
+
+    # Requests are spread over all keys at once instead of sleeping on a single one
+    self.key_pool = ApiKeyPool(api_keys,
+                               requests_per_minute or cfg.gemini_requests_per_minute,
+                               tokens_per_minute or cfg.gemini_tokens_per_minute,
+                               cooldown=cfg.gemini_key_cooldown)
+    self.key_models = {}
+    self.key_models_lock = threading.Lock()
+
+    models = self.models_for_key(self.api_keys[0])
+    self.model = models['main']
+    self.validator_model = models['validator']
+    self.identify_model = models['identify']
+    self.incorrect_predictions = []
+    self.message_history = []
+
+  def load_prompts(self):
+    try:
+      with open('prompts.json', 'r') as f:
+        return json.load(f)
+    except FileNotFoundError:
+      logging.warning("prompts.json not found. Using default prompts.")
+      return {}
+
+  def models_for_key(self, api_key):
+    """Return the main, validator and identify models bound to the client of one API key."""
+    with self.key_models_lock:
+      if api_key not in self.key_models:
+        # genai.configure is global, so each key's client is created once and pinned to its models
+        if self.api_endpoint:
+          genai.configure(api_key=api_key, transport='rest', client_options={'api_endpoint': self.api_endpoint})
+        else:
+          genai.configure(api_key=api_key)
+        models = {
+            'main': self.create_main_model(self.model_name),
+            'validator': self.create_validator_model(self.model_name),
+            'identify': self.create_identify_model(self.model_name),
+        }
+        bind_to_configured_client(models.values())
+        self.key_models[api_key] = models
+      return self.key_models[api_key]
+
+  def create_main_model(self, model_name):
     generation_config = {
         "temperature": 1,
         "top_p": 1,
@@ -101,40 +184,12 @@ class GeminiInference():
             "threshold": "BLOCK_ONLY_HIGH"
         },
     ]
-
-    self.system_prompt = self.prompts.get(self.car_brand, {}).get('main_prompt', DEFAULT_PROMPT)
-    
-    self.model = genai.GenerativeModel(
-        model_name=model_name,
-        generation_config=generation_config,
-        safety_settings=safety_settings,
-        system_instruction=self.system_prompt
-    )
-
-    self.validator_model = self.create_validator_model(model_name)
-    self.identify_model = self.create_identify_model(model_name)
-    self.incorrect_predictions = []
-    self.message_history = []
-
-  def load_prompts(self):
-    try:
-      with open('prompts.json', 'r') as f:
-        return json.load(f)
-    except FileNotFoundError:
-      logging.warning("prompts.json not found. Using default prompts.")
-      return {}
-
-  def configure_api(self):
-    genai.configure(api_key=self.api_keys[self.current_key_index])
-
-  def switch_api_key(self):
-    self.current_key_index = (self.current_key_index + 1) % len(self.api_keys)
-    self.configure_api()
-    logging.info(f"Switched to API key index: {self.current_key_index}")
+    return genai.GenerativeModel(model_name=model_name,
+                                 generation_config=generation_config,
+                                 safety_settings=safety_settings,
+                                 system_instruction=self.system_prompt)
 
   def create_identify_model(self, model_name):
-    genai.configure(api_key=self.api_keys[self.current_key_index])
-    
     generation_config = {
         "temperature": 1,
         "top_p": 1,
@@ -164,8 +219,6 @@ class GeminiInference():
                                  safety_settings=safety_settings)
 
   def create_validator_model(self, model_name):
-    genai.configure(api_key=self.api_keys[self.current_key_index])
-    
     generation_config = {
         "temperature": 1,
         "top_p": 1,
@@ -194,54 +247,81 @@ class GeminiInference():
                                  generation_config=generation_config,
                                  safety_settings=safety_settings)
 
-  def get_response(self, img_data, retry=False):
-    max_retries = 10
-    base_delay = 5
-    
+  @staticmethod
+  def is_rate_limit_error(error):
+    if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+      return True
+    message = str(error).lower()
+    return "429" in message or "quota" in message
+
+  @staticmethod
+  def estimate_tokens(*texts, images=1):
+    # ~258 tokens per image, ~4 characters per text token and room for the answer
+    return 258 * images + sum(len(text) for text in texts) // 4 + 512
+
+  def generate(self, request_fn, estimated_tokens, max_retries=10):
+    """
+    Run request_fn(models) on the least-loaded healthy API key.
+
+    Keys answering 429 are put into cooldown and the request moves on to another key.
+    """
     for attempt in range(max_retries):
-        try:
-            image_parts = [
-                {
-                    "inline_data": {
-                        "mime_type": "image/jpeg",
-                        "data": img_data.getvalue() if isinstance(img_data, io.BytesIO) else img_data.read_bytes()
-                    }
-                },
-            ]
-            
-            prompt_parts = [' '] if not retry else [
-                "It is not correct. Try again. Look for the numbers that are highly VAG number"
-            ]
-            
-            full_prompt = image_parts + prompt_parts
-            
-            sleep(random.uniform(2, 6))
-            
-            chat = self.model.start_chat(history=self.message_history)
-            response = chat.send_message(full_prompt)
-            
-            logging.info(f"Main model response: {response.text}")
-            
-            self.message_history.append({"role": "user", "parts": full_prompt})
-            self.message_history.append({"role": "model", "parts": [response.text]})
-            
-            return response.text
-            
-        except Exception as e:
-            if "quota" in str(e).lower():
-                delay = base_delay * (2 ** attempt) + random.uniform(0, 1)
-                if delay > 300:
-                    self.switch_api_key()
-                    delay = base_delay
-                logging.warning(f"Rate limit reached. Attempt {attempt + 1}/{max_retries}. Retrying in {delay:.2f} seconds...")
-                time.sleep(delay)
-            else:
-                logging.error(f"Error in get_response: {str(e)}")
-                raise
-    
+      api_key = self.key_pool.acquire(estimated_tokens)
+      try:
+        response = request_fn(self.models_for_key(api_key))
+      except Exception as e:
+        if self.is_rate_limit_error(e):
+          self.key_pool.penalize(api_key)
+          logging.warning(f"Rate limit reached. Attempt {attempt + 1}/{max_retries}. Retrying on another key...")
+          continue
+        self.key_pool.release(api_key, estimated_tokens)
+        raise
+
+      usage = getattr(response, 'usage_metadata', None)
+      self.key_pool.release(api_key, estimated_tokens, getattr(usage, 'total_token_count', None))
+      return response
+
     logging.error("Max retries reached. Unable to get a response.")
     raise Exception("Max retries reached. Unable to get a response.")
 
+  def image_part(self, img_data):
+    """Build the inline image part of a request from the downscaled, re-encoded upload."""
+    image_bytes = img_data.getvalue() if isinstance(img_data, io.BytesIO) else img_data.read_bytes()
+    data, mime_type = prepared_image(image_bytes)
+    return {
+        "inline_data": {
+            "mime_type": mime_type,
+            "data": data
+        }
+    }
+
+  def get_response(self, img_data, retry=False):
+    try:
+        image_parts = [self.image_part(img_data)]
+        
+        prompt_parts = [' '] if not retry else [
+            "It is not correct. Try again. Look for the numbers that are highly VAG number"
+        ]
+        
+        full_prompt = image_parts + prompt_parts
+        history = list(self.message_history)
+        estimated_tokens = self.estimate_tokens(self.system_prompt, *prompt_parts,
+                                                images=1 + sum(m["role"] == "user" for m in history))
+
+        response = self.generate(lambda models: models['main'].start_chat(history=history).send_message(full_prompt),
+                                 estimated_tokens)
+        
+        logging.info(f"Main model response: {response.text}")
+        
+        self.message_history.append({"role": "user", "parts": full_prompt})
+        self.message_history.append({"role": "model", "parts": [response.text]})
+        
+        return response.text
+        
+    except Exception as e:
+        logging.error(f"Error in get_response: {str(e)}")
+        raise
+
   def format_part_number(self, number):
     if self.car_brand == 'audi' and re.match(r'^[A-Z0-9]{3}[0-9]{3}[0-9]{3,5}[A-Z]?$', number.replace(' ', '').replace('-', '')):
         number = number.replace('-', '').replace(' ', '')
@@ -278,18 +358,9 @@ class GeminiInference():
     return number
 
   def validate_number(self, extracted_number, img_data, car_brand=None):
-    genai.configure(api_key=self.api_keys[self.current_key_index])
-    
     formatted_number = self.format_part_number(extracted_number)
     
-    image_parts = [
-        {
-            "inline_data": {
-                "mime_type": "image/jpeg",
-                "data": img_data.getvalue() if isinstance(img_data, io.BytesIO) else img_data.read_bytes()
-            }
-        },
-    ]
+    image_parts = [self.image_part(img_data)]
     
     if car_brand == None:
         validation_prompt = self.prompts.get(self.car_brand, {}).get('validation_prompt', "")
@@ -305,48 +376,21 @@ class GeminiInference():
         prompt,
     ]
     
-    response = self.validator_model.generate_content(prompt_parts)
+    response = self.generate(lambda models: models['validator'].generate_content(prompt_parts),
+                             self.estimate_tokens(prompt))
     
     logging.info(f"Validator model response: {response.text}")
     return response.text
 
   def final_validate_number(self, extracted_number, img_data, predicted_number):
     #Checking format
-    if self.car_brand in self.formats:
-      brand_formats = self.formats[self.car_brand]["format"].split(",")
-      number = extracted_number
-
-      normalized_number = number.replace("-", " ").replace(".", " ")
-
-      number_parts = normalized_number.split()
-      flag = True #Extracted number is incorrect in any format
-      for brand_format in brand_formats:
-        format_parts = list(map(int, brand_format.split("-")))
-
-        if len(number_parts) != len(format_parts):
-          continue
-
-        for part, expected_length in zip(number_parts, format_parts):
-          if len(part) != expected_length:
-            continue
-        flag = False
-
-      if flag:
-        logging.info(f"Final Validator model response: Wrong Format")
-        return "<START>NONE<END>"
+    if not self.matcher.match(extracted_number):
+      logging.info(f"Final Validator model response: Wrong Format")
+      return "<START>NONE<END>"
 
-    genai.configure(api_key=self.api_keys[self.current_key_index])
-      
     formatted_number = self.format_part_number(extracted_number)
       
-    image_parts = [
-        {
-            "inline_data": {
-                "mime_type": "image/jpeg",
-                "data": img_data.getvalue() if isinstance(img_data, io.BytesIO) else img_data.read_bytes()
-            }
-        },
-    ]
+    image_parts = [self.image_part(img_data)]
 
     prompt = [
         f"Your task is to identify the number {predicted_number} on the provided image. ",
@@ -367,27 +411,52 @@ class GeminiInference():
         prompt,
     ]
       
-    response = self.validator_model.generate_content(prompt_parts)
+    response = self.generate(lambda models: models['validator'].generate_content(prompt_parts),
+                             self.estimate_tokens(prompt))
       
     logging.info(f"Final Validator model response: {response.text}")
     return response.text.split('<START>')[-1].split("<END>")[0].strip()
 
+  def fork(self):
+    """Return a copy that shares the configured models but keeps its own chat state."""
+    clone = copy.copy(self)
+    clone.incorrect_predictions = []
+    clone.message_history = []
+    return clone
+
   def reset_incorrect_predictions(self):
     self.incorrect_predictions = []
     self.message_history = []
 
-  def __call__(self, image_path):
-    self.configure_api()
-    
+  def read_image(self, image_path):
     if image_path.startswith('http'):
-        response = requests.get(image_path, stream=True)
-        img_data = io.BytesIO(response.content)
-    else:
-        img = Path(image_path)
-        if not img.exists():
-            raise FileNotFoundError(f"Could not find image: {img}")
-        img_data = img
+        return io.BytesIO(fetch_image(image_path))
+    img = Path(image_path)
+    if not img.exists():
+        raise FileNotFoundError(f"Could not find image: {img}")
+    return img
+
+  def image_hash(self, img_data):
+    image_bytes = img_data.getvalue() if isinstance(img_data, io.BytesIO) else img_data.read_bytes()
+    return hashlib.sha256(image_bytes).hexdigest()
+
+  def __call__(self, image_path):
+    img_data = self.read_image(image_path)
+
+    if self.recognition_cache is None:
+        return self.recognize(img_data)
+
+    image_hash = self.image_hash(img_data)
+    cached_number = self.recognition_cache.get(image_hash, self.model_name, self.prompt_hash)
+    if cached_number is not None:
+        logging.info(f"Recognition cache hit for {image_path}: {cached_number}")
+        return cached_number
 
+    number = self.recognize(img_data)
+    self.recognition_cache.put(image_hash, self.model_name, self.prompt_hash, number)
+    return number
+
+  def recognize(self, img_data):
     self.message_history = []
 
     max_attempts = 2
@@ -396,6 +465,14 @@ class GeminiInference():
         extracted_number = self.extract_number(answer)
         
         logging.info(f"Attempt {attempt + 1}: Extracted number: {extracted_number}")
+
+        # Candidates that cannot be a part number of this brand are retried without asking the validator
+        if extracted_number.upper() != "NONE" and not self.matcher.match(extracted_number):
+            logging.warning(f"Extracted number {extracted_number} does not match any {self.car_brand} format")
+            self.incorrect_predictions.append(extracted_number)
+            if attempt < max_attempts - 1:
+                logging.info(f"Attempting to find another number (Attempt {attempt + 2}/{max_attempts})")
+            continue
         
         if extracted_number.upper() != "NONE":
             validation_result = self.validate_number(extracted_number, img_data)
@@ -418,3 +495,62 @@ class GeminiInference():
     self.reset_incorrect_predictions()
     logging.warning("All attempts failed. Returning NONE.")
     return "NONE"
+
+  def recognize_many(self, image_paths):
+    """
+    Recognize the part number on the best of several photos with a single main-model request.
+
+    All photos are sent together and the model picks the one holding the label, so a
+    listing whose label is on the second or third photo costs one round-trip instead of one
+    per photo. The picked number still goes through the format check and both validators.
+
+    Returns:
+      tuple: (number, image_path); number is "NONE" and image_path None if no photo holds a valid number.
+    """
+    images = [self.read_image(image_path) for image_path in image_paths]
+    image_hashes = [self.image_hash(img_data) for img_data in images]
+
+    if self.recognition_cache is not None:
+      for image_path, image_hash in zip(image_paths, image_hashes):
+        cached_number = self.recognition_cache.get(image_hash, self.model_name, self.prompt_hash)
+        if cached_number is not None and cached_number.upper() != "NONE":
+          logging.info(f"Recognition cache hit for {image_path}: {cached_number}")
+          return cached_number, image_path
+
+    prompt_parts = []
+    for i, img_data in enumerate(images, start=1):
+      prompt_parts.append(f"Photo {i}:")
+      prompt_parts.append(self.image_part(img_data))
+    prompt = MULTI_IMAGE_PROMPT.format(num_images=len(images))
+    prompt_parts.append(prompt)
+
+    response = self.generate(lambda models: models['main'].generate_content(prompt_parts),
+                             self.estimate_tokens(self.system_prompt, prompt, images=len(images)))
+    logging.info(f"Main model multi-image response: {response.text}")
+
+    image_match = re.search(r'<IMAGE>\s*(\d+)\s*</IMAGE>', response.text)
+    index = int(image_match.group(1)) if image_match else 0
+    extracted_number = self.extract_number(response.text)
+    if not 1 <= index <= len(images) or extracted_number.upper() == "NONE":
+      logging.warning(f"No number found on any of {len(images)} photos")
+      return "NONE", None
+
+    img_data = images[index - 1]
+    logging.info(f"Photo {index} picked, extracted number: {extracted_number}")
+    if not self.matcher.match(extracted_number):
+      logging.warning(f"Extracted number {extracted_number} does not match any {self.car_brand} format")
+      return "NONE", None
+
+    self.reset_incorrect_predictions()
+    if "<VALID>" not in self.validate_number(extracted_number, img_data):
+      logging.warning(f"Validation failed")
+      return "NONE", None
+    extracted_number = self.final_validate_number(extracted_number, img_data, extracted_number)
+    if extracted_number == "NONE" or extracted_number == "<START>NONE<END>":
+      return "NONE", None
+
+    number = self.format_part_number(extracted_number)
+    logging.info(f"Valid number found: {number}")
+    if self.recognition_cache is not None:
+      self.recognition_cache.put(image_hashes[index - 1], self.model_name, self.prompt_hash, number)
+    return number, image_paths[index - 1]
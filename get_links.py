@@ -1,14 +1,15 @@
-from picker_model import TargetModel
+from dataprocessor import Processor
+from config import Config as cfg
 from collect_data import collect_links
 import json
 
-def get_links(car_brand="toyota", max_pages=3, max_links=15, offset=0):
+def get_links(car_brand="toyota", max_pages=3, max_links=15, offset=0, concurrency=None):
     with open('/content/part-number-recognition/prompts.json', 'r') as f:
       prompts = json.load(f)
 
     first_page_link = prompts[car_brand.lower()]['first_page_url']
 
-    t = TargetModel()
-    links = collect_links(t, first_page_link, max_pages=max_pages, max_links=max_links, offset=offset)
+    processor = Processor(cfg.image_size, cfg.batch_size)
+    links = collect_links(processor, first_page_link, max_pages=max_pages, max_links=max_links, offset=offset, concurrency=concurrency)
     print("Number of links received: ",len(links))
     return links
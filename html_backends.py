@@ -0,0 +1,180 @@
+def has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+def clean_text(text):
+    return ' '.join(text.split())
+
+
+class BeautifulSoupBackend():
+    """
+    Reference extraction backend: full BeautifulSoup tree with the html.parser builder.
+    """
+    def __init__(self, link_prefix='https://'):
+        from bs4 import BeautifulSoup
+        self.BeautifulSoup = BeautifulSoup
+        self.link_prefix = link_prefix
+
+    def parse(self, content):
+        return self.BeautifulSoup(content, 'html.parser')
+
+    def extract_products(self, tree):
+        # Try different selectors to find product items
+        product_items = (
+            tree.select('li.Product') or
+            tree.select('div.ProductTile') or
+            tree.select('div[class*="product"]')
+        )
+        products = []
+        for item in product_items:
+            link = item.select_one(f'a[href^="{self.link_prefix}"]')
+            img = item.select_one(f'img[src^="{self.link_prefix}"]')
+            products.append((img.get('src') if img else None, link.get('href') if link else None))
+        return products
+
+    def extract_image_links(self, tree):
+        image_tags = []
+        image_container_layout1 = tree.find('ul', class_='ProductImage__images')
+        if image_container_layout1:
+            image_tags = image_container_layout1.find_all('img')
+        else:
+            image_slider_layout2 = tree.find('div', class_='ivcsLx')
+            if image_slider_layout2:
+                image_tags = image_slider_layout2.find_all('img', class_='xzFse')
+        return [img.get('src') or img.get('data-src') for img in image_tags if img.get('src') or img.get('data-src')]
+
+    def extract_product_info(self, tree):
+        title_elem = tree.select_one('h1.ProductTitle__text') or tree.find('h1') or tree.title
+        price_elem = tree.find('dd', class_='Price__value')
+        return {
+            'title': clean_text(title_elem.get_text()) if title_elem else 'N/A',
+            'price': price_elem.get_text().strip() if price_elem else 'N/A',
+        }
+
+
+class LxmlBackend():
+    """
+    libxml2 parser with precompiled XPath queries equivalent to the BeautifulSoup selectors.
+    """
+    def __init__(self, link_prefix='https://'):
+        import lxml.html
+        from lxml import etree
+        self.lxml_html = lxml.html
+        self.product_queries = [
+            etree.XPath(f"//li[{has_class('Product')}]"),
+            etree.XPath(f"//div[{has_class('ProductTile')}]"),
+            etree.XPath("//div[contains(@class, 'product')]"),
+        ]
+        self.product_link = etree.XPath(f".//a[starts-with(@href, '{link_prefix}')]/@href")
+        self.product_img = etree.XPath(f".//img[starts-with(@src, '{link_prefix}')]/@src")
+        self.layout1_container = etree.XPath(f"(//ul[{has_class('ProductImage__images')}])[1]")
+        self.layout2_container = etree.XPath(f"(//div[{has_class('ivcsLx')}])[1]")
+        self.layout2_images = etree.XPath(f".//img[{has_class('xzFse')}]")
+        self.title_queries = [
+            etree.XPath(f"(//h1[{has_class('ProductTitle__text')}])[1]"),
+            etree.XPath("(//h1)[1]"),
+            etree.XPath("(//title)[1]"),
+        ]
+        self.price = etree.XPath(f"(//dd[{has_class('Price__value')}])[1]")
+
+    def parse(self, content):
+        return self.lxml_html.fromstring(content)
+
+    def extract_products(self, tree):
+        product_items = []
+        for query in self.product_queries:
+            product_items = query(tree)
+            if product_items:
+                break
+        products = []
+        for item in product_items:
+            links, imgs = self.product_link(item), self.product_img(item)
+            products.append((imgs[0] if imgs else None, links[0] if links else None))
+        return products
+
+    def extract_image_links(self, tree):
+        image_tags = []
+        image_container_layout1 = self.layout1_container(tree)
+        if image_container_layout1:
+            image_tags = image_container_layout1[0].iter('img')
+        else:
+            image_slider_layout2 = self.layout2_container(tree)
+            if image_slider_layout2:
+                image_tags = self.layout2_images(image_slider_layout2[0])
+        return [img.get('src') or img.get('data-src') for img in image_tags if img.get('src') or img.get('data-src')]
+
+    def extract_product_info(self, tree):
+        titles = next((elems for elems in (query(tree) for query in self.title_queries) if elems), [])
+        prices = self.price(tree)
+        return {
+            'title': clean_text(titles[0].text_content()) if titles else 'N/A',
+            'price': prices[0].text_content().strip() if prices else 'N/A',
+        }
+
+
+class SelectolaxBackend():
+    """
+    Lexbor (selectolax) parser, which runs the CSS selectors natively.
+    """
+    def __init__(self, link_prefix='https://'):
+        from selectolax.lexbor import LexborHTMLParser
+        self.HTMLParser = LexborHTMLParser
+        self.link_prefix = link_prefix
+
+    def parse(self, content):
+        return self.HTMLParser(content)
+
+    def extract_products(self, tree):
+        product_items = (
+            tree.css('li.Product') or
+            tree.css('div.ProductTile') or
+            tree.css('div[class*="product"]')
+        )
+        products = []
+        for item in product_items:
+            link = item.css_first(f'a[href^="{self.link_prefix}"]')
+            img = item.css_first(f'img[src^="{self.link_prefix}"]')
+            products.append((img.attributes.get('src') if img is not None else None,
+                             link.attributes.get('href') if link is not None else None))
+        return products
+
+    def extract_image_links(self, tree):
+        image_tags = []
+        image_container_layout1 = tree.css_first('ul.ProductImage__images')
+        if image_container_layout1 is not None:
+            image_tags = image_container_layout1.css('img')
+        else:
+            image_slider_layout2 = tree.css_first('div.ivcsLx')
+            if image_slider_layout2 is not None:
+                image_tags = image_slider_layout2.css('img.xzFse')
+        links = []
+        for img in image_tags:
+            src = img.attributes.get('src') or img.attributes.get('data-src')
+            if src:
+                links.append(src)
+        return links
+
+    def extract_product_info(self, tree):
+        title_elem = next((elem for elem in (tree.css_first(selector) for selector in ['h1.ProductTitle__text', 'h1', 'title']) if elem is not None), None)
+        price_elem = tree.css_first('dd.Price__value')
+        return {
+            'title': clean_text(title_elem.text()) if title_elem is not None else 'N/A',
+            'price': price_elem.text().strip() if price_elem is not None else 'N/A',
+        }
+
+
+HTML_BACKENDS = {
+    'bs4': BeautifulSoupBackend,
+    'lxml': LxmlBackend,
+    'selectolax': SelectolaxBackend,
+}
+
+def load_html_backend(backend, link_prefix='https://'):
+    """
+    Every backend parses raw page bytes with parse() and extracts the same products,
+    image links and product info from the parsed tree.
+
+    Search result items only count links and images whose URL starts with link_prefix.
+    """
+    assert backend in HTML_BACKENDS, f"Unknown HTML backend: {backend}"
+    return HTML_BACKENDS[backend](link_prefix)
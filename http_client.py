@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Config as cfg
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36'
+}
+
+
+def build_adapter(pool_size):
+    # Connection errors and 5xx answers are retried with backoff; 429/503 are left to the
+    # host rate controller, which has to see them to slow down. urllib3 would otherwise
+    # retry any 413/429/503 answer carrying Retry-After on its own
+    retry = Retry(total=cfg.http_retries,
+                  backoff_factor=cfg.http_backoff_factor,
+                  status_forcelist=[500, 502, 504],
+                  allowed_methods=['GET', 'HEAD'],
+                  respect_retry_after_header=False,
+                  raise_on_status=False)
+    return HTTPAdapter(pool_connections=cfg.http_pool_hosts, pool_maxsize=pool_size, max_retries=retry, pool_block=False)
+
+
+def build_session():
+    """
+    Build a keep-alive session with one connection pool per host.
+
+    Hosts listed in cfg.http_host_pool_sizes get their own pool size, every other
+    host uses cfg.http_pool_size.
+    """
+    session = requests.Session()
+    session.headers.update(DEFAULT_HEADERS)
+    session.mount('http://', build_adapter(cfg.http_pool_size))
+    session.mount('https://', build_adapter(cfg.http_pool_size))
+    for prefix, pool_size in cfg.http_host_pool_sizes.items():
+        session.mount(prefix, build_adapter(pool_size))
+    return session
+
+
+class HostRateController():
+    """
+    Adaptive politeness limit for one host (AIMD).
+
+    Request starts are paced at `rate` per second with at most max_in_flight requests
+    at once. Every fast successful answer raises the rate additively up to max_rate;
+    429/503 answers, timeouts and answers slower than cfg.http_latency_target cut it
+    multiplicatively, at most once per cfg.http_decrease_interval seconds, and a
+    Retry-After header pauses the host.
+    """
+    def __init__(self, host, rate, max_rate, max_in_flight=None):
+        self.host = host
+        self.rate = rate
+        self.max_rate = max_rate
+        self.max_in_flight = max_in_flight
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self.next_start = time.monotonic()
+        self.last_decrease = 0
+        self.latency = None
+
+    def acquire(self):
+        if self.slots is not None:
+            self.slots.acquire()
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + 1 / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self):
+        if self.slots is not None:
+            self.slots.release()
+
+    def increase(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + cfg.http_rate_increase)
+
+    def decrease(self, reason, retry_after=None):
+        with self.lock:
+            now = time.monotonic()
+            if retry_after:
+                self.next_start = max(self.next_start, now + retry_after)
+            # Concurrent requests see the same pushback; cut the rate once per interval
+            if now - self.last_decrease < cfg.http_decrease_interval:
+                return
+            self.last_decrease = now
+            self.rate = max(cfg.http_min_rate, self.rate * cfg.http_rate_decrease)
+        logging.warning(f"{self.host}: {reason}, rate lowered to {self.rate:.2f} requests/s")
+
+    def record(self, status_code, latency, retry_after=None):
+        """
+        Update the rate from one finished request; status_code is None for connection errors and timeouts.
+        """
+        with self.lock:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        if status_code in (429, 503):
+            self.decrease(f"HTTP {status_code}", retry_after)
+        elif status_code is None:
+            self.decrease("connection error")
+        elif latency > cfg.http_latency_target:
+            self.decrease(f"slow answer ({latency:.1f}s)")
+        elif status_code < 400:
+            self.increase()
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+def get_host_controller(url):
+    """
+    Return the HostRateController of the host a URL points to.
+    """
+    host = urlsplit(url).hostname or ''
+    with _controllers_lock:
+        if host not in _controllers:
+            rate, max_rate, max_in_flight = cfg.http_host_limits.get(host, cfg.http_default_host_limit)
+            _controllers[host] = HostRateController(host, rate, max_rate, max_in_flight)
+        return _controllers[host]
+
+def rate_metrics():
+    """
+    Return the current request rate (requests/s) and smoothed latency (s) of every host seen so far.
+    """
+    with _controllers_lock:
+        controllers = list(_controllers.values())
+    return {controller.host: {'rate': round(controller.rate, 2),
+                              'latency': round(controller.latency, 3) if controller.latency is not None else None}
+            for controller in controllers}
+
+def parse_retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+_session = None
+_session_lock = threading.Lock()
+
+def get_session():
+    """
+    Return the process-wide HTTP session shared by every fetch path.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = build_session()
+        return _session
+
+def get(url, timeout=None, **kwargs):
+    """
+    GET a URL through the shared session and the adaptive rate controller of its host,
+    with the default (connect, read) timeout.
+    """
+    controller = get_host_controller(url)
+    controller.acquire()
+    start = time.monotonic()
+    try:
+        response = get_session().get(url, timeout=timeout or (cfg.http_connect_timeout, cfg.http_read_timeout), **kwargs)
+    except requests.RequestException:
+        controller.record(None, time.monotonic() - start)
+        raise
+    finally:
+        controller.release()
+    controller.record(response.status_code, time.monotonic() - start, parse_retry_after(response))
+    return response
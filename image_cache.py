@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import os
+import threading
+
+from config import Config as cfg
+import http_client
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class ImageCache():
+    """
+    Content-addressed on-disk image cache keyed by URL.
+
+    Every URL maps to the SHA-256 of its content, and the content itself is stored
+    once per hash. Blobs are evicted least-recently-used first once the cache grows
+    over max_bytes.
+    """
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or cfg.image_cache_dir
+        self.max_bytes = max_bytes or cfg.image_cache_max_bytes
+        self.urls_dir = os.path.join(self.root, 'urls')
+        self.blobs_dir = os.path.join(self.root, 'blobs')
+        os.makedirs(self.urls_dir, exist_ok=True)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.url_locks = {}
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(self.blobs_dir) if entry.is_file())
+
+    def _url_path(self, url):
+        return os.path.join(self.urls_dir, hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def _blob_path(self, digest):
+        return os.path.join(self.blobs_dir, digest)
+
+    def _url_lock(self, url):
+        with self.lock:
+            return self.url_locks.setdefault(url, threading.Lock())
+
+    @staticmethod
+    def _write_atomic(path, data):
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def lookup(self, url):
+        """
+        Return the content hash cached for a URL, or None if the image is not cached.
+        """
+        try:
+            with open(self._url_path(url), 'r') as f:
+                digest = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return digest if os.path.exists(self._blob_path(digest)) else None
+
+    def get(self, url):
+        """
+        Return cached image bytes for a URL, or None on a cache miss.
+        """
+        digest = self.lookup(url)
+        if digest is None:
+            return None
+        blob_path = self._blob_path(digest)
+        try:
+            with open(blob_path, 'rb') as f:
+                data = f.read()
+            os.utime(blob_path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, url, data):
+        """
+        Store image bytes for a URL and return their content hash.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self._blob_path(digest)
+        if not os.path.exists(blob_path):
+            self._write_atomic(blob_path, data)
+            with self.lock:
+                self.total_bytes += len(data)
+        self._write_atomic(self._url_path(url), digest.encode('utf-8'))
+
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+        return digest
+
+    def evict(self):
+        """
+        Remove least recently used blobs until the cache fits into max_bytes, together
+        with the URL entries that point to them.
+        """
+        with self.lock:
+            entries = sorted((entry for entry in os.scandir(self.blobs_dir) if entry.is_file()),
+                             key=lambda entry: entry.stat().st_mtime)
+            total = sum(entry.stat().st_size for entry in entries)
+            evicted = set()
+            for entry in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    size = entry.stat().st_size
+                    os.remove(entry.path)
+                    total -= size
+                    evicted.add(entry.name)
+                except FileNotFoundError:
+                    continue
+            self.total_bytes = total
+            removed_urls = self._remove_url_entries(evicted)
+            logging.info(f"Image cache evicted {len(evicted)} images and {removed_urls} URL entries, "
+                         f"down to {total / 1024 ** 2:.1f} MB")
+
+    def _remove_url_entries(self, digests):
+        if not digests:
+            return 0
+        removed = 0
+        for entry in os.scandir(self.urls_dir):
+            if not entry.is_file() or entry.name.endswith('.tmp'):
+                continue
+            try:
+                with open(entry.path, 'r') as f:
+                    if f.read().strip() not in digests:
+                        continue
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def fetch(self, url, timeout=None, headers=None):
+        """
+        Return image bytes for a URL, downloading them only on a cache miss.
+
+        Args:
+            url (str): The image URL.
+            timeout (float): Download timeout in seconds (default is cfg.image_fetch_timeout).
+            headers (dict): Request headers for the download.
+
+        Returns:
+            bytes: The image content.
+        """
+        data = self.get(url)
+        if data is not None:
+            return data
+
+        # Only one thread downloads a given URL, the others wait and read it from the cache
+        with self._url_lock(url):
+            data = self.get(url)
+            if data is not None:
+                return data
+            response = http_client.get(url, headers=headers, timeout=timeout or cfg.image_fetch_timeout)
+            response.raise_for_status()
+            data = response.content
+            self.put(url, data)
+
+        with self.lock:
+            self.url_locks.pop(url, None)
+        return data
+
+
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+def get_image_cache():
+    """
+    Return the process-wide ImageCache.
+    """
+    global _image_cache
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache()
+        return _image_cache
+
+def fetch_image(url, timeout=None, headers=None):
+    """
+    Return image bytes for a URL through the shared image cache.
+    """
+    return get_image_cache().fetch(url, timeout=timeout, headers=headers)
@@ -0,0 +1,55 @@
+import hashlib
+import io
+import logging
+
+from PIL import Image, ImageOps
+
+from config import Config as cfg
+from image_cache import get_image_cache
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+def prepare_image(data, max_side=None, quality=None):
+    """
+    Turn downloaded image bytes into a Gemini upload.
+
+    The longest side is capped at max_side and anything that is not already a small
+    enough RGB JPEG is re-encoded to JPEG, so PNG/WebP sources get the right mime type.
+
+    Returns:
+        tuple: (bytes, mime_type)
+    """
+    max_side = max_side or cfg.gemini_upload_max_side
+    quality = quality or cfg.gemini_upload_jpeg_quality
+
+    img = Image.open(io.BytesIO(data))
+    if img.format == 'JPEG' and img.mode == 'RGB' and max(img.size) <= max_side:
+        return data, 'image/jpeg'
+
+    if img.format == 'JPEG':
+        img.draft('RGB', (max_side, max_side))
+    img = ImageOps.exif_transpose(img).convert('RGB')
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    output = io.BytesIO()
+    img.save(output, format='JPEG', quality=quality, optimize=True)
+    return output.getvalue(), 'image/jpeg'
+
+
+def prepared_image(data, max_side=None, quality=None):
+    """
+    Return prepare_image() output through the shared image cache, so every image is prepared once.
+    """
+    max_side = max_side or cfg.gemini_upload_max_side
+    quality = quality or cfg.gemini_upload_jpeg_quality
+
+    cache = get_image_cache()
+    key = f"upload:{max_side}:{quality}:{hashlib.sha256(data).hexdigest()}"
+    prepared = cache.get(key)
+    if prepared is None:
+        prepared, _ = prepare_image(data, max_side, quality)
+        cache.put(key, prepared)
+        logging.info(f"Prepared image for upload: {len(data) / 1024:.0f} KB -> {len(prepared) / 1024:.0f} KB")
+    return prepared, 'image/jpeg'
@@ -0,0 +1,68 @@
+import json
+import logging
+import os
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class ResultJournal():
+    """
+    Append-only JSONL journal of encode() results, fsynced after every record.
+
+    A restarted run opened with resume=True gets back every record written before
+    the crash and can skip those URLs.
+    """
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.lock = threading.Lock()
+        self.records = self.load() if resume else {}
+
+        self.file = open(path, 'a' if resume else 'w', encoding='utf-8')
+        if resume and self.file.tell() > 0 and not self._ends_with_newline():
+            # The previous run died in the middle of a line; start a fresh one
+            self.file.write('\n')
+        logging.info(f"Journal {path}: {len(self.records)} records restored")
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def load(self):
+        """
+        Read all complete records from the journal.
+
+        Returns:
+            dict: Records keyed by listing URL.
+        """
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partially written line
+                records[record['url']] = record
+        return records
+
+    def __contains__(self, url):
+        return url in self.records
+
+    def append(self, record):
+        """
+        Durably append one encode() result.
+        """
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.records[record['url']] = record
+
+    def close(self):
+        with self.lock:
+            self.file.close()
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class TokenBucket():
+    """
+    Token bucket refilled continuously at `per_minute` tokens per minute.
+    """
+    def __init__(self, per_minute, capacity=None):
+        self.capacity = float(capacity or per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def fill_ratio(self):
+        return self.tokens / self.capacity
+
+    def wait_time(self, amount):
+        """Seconds until `amount` tokens are available (0 if they already are)."""
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        # May go negative when actual usage turns out higher than estimated
+        self.tokens -= amount
+
+
+class KeyState():
+    def __init__(self, api_key, requests_per_minute, tokens_per_minute):
+        self.api_key = api_key
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+
+class ApiKeyPool():
+    """
+    Schedules Gemini requests over several API keys.
+
+    Every key has a requests/min and a tokens/min bucket. acquire() hands out the
+    least-loaded healthy key and blocks only when every key is exhausted or cooling
+    down after a 429.
+    """
+    def __init__(self, api_keys, requests_per_minute, tokens_per_minute, cooldown=60, max_cooldown=600):
+        self.keys = [KeyState(key, requests_per_minute, tokens_per_minute) for key in dict.fromkeys(api_keys)]
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.condition = threading.Condition()
+
+    def _state(self, api_key):
+        return next(state for state in self.keys if state.api_key == api_key)
+
+    def acquire(self, estimated_tokens):
+        """
+        Block until a key can serve a request of `estimated_tokens` and reserve it.
+
+        Returns:
+            str: The API key to use.
+        """
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                best, best_load, wait = None, None, None
+                for state in self.keys:
+                    state.requests.refill(now)
+                    state.tokens.refill(now)
+                    key_wait = max(state.cooldown_until - now,
+                                   state.requests.wait_time(1),
+                                   state.tokens.wait_time(estimated_tokens))
+                    if key_wait > 0:
+                        wait = key_wait if wait is None else min(wait, key_wait)
+                        continue
+                    load = (state.in_flight, -min(state.requests.fill_ratio(), state.tokens.fill_ratio()))
+                    if best is None or load < best_load:
+                        best, best_load = state, load
+
+                if best is not None:
+                    best.requests.consume(1)
+                    best.tokens.consume(estimated_tokens)
+                    best.in_flight += 1
+                    return best.api_key
+
+                logging.info(f"All API keys are busy. Waiting {wait:.2f} seconds for capacity...")
+                self.condition.wait(timeout=wait)
+
+    def release(self, api_key, estimated_tokens=0, used_tokens=None):
+        """
+        Return a key after a successful (or non rate-limited) request.
+        """
+        with self.condition:
+            state = self._state(api_key)
+            state.in_flight -= 1
+            state.failures = 0
+            if used_tokens is not None:
+                state.tokens.consume(used_tokens - estimated_tokens)
+            self.condition.notify_all()
+
+    def penalize(self, api_key):
+        """
+        Put a key that returned 429 into an exponentially growing cooldown.
+        """
+        with self.condition:
+            state = self._state(api_key)
+            state.in_flight -= 1
+            state.failures += 1
+            cooldown = min(self.cooldown * 2 ** (state.failures - 1), self.max_cooldown)
+            state.cooldown_until = time.monotonic() + cooldown
+            logging.warning(f"API key ...{api_key[-4:]} rate limited. Cooling down for {cooldown:.0f} seconds")
+            self.condition.notify_all()
@@ -1,24 +1,31 @@
 from config import * 
 from picker_model import TargetModel
 from gemini_model import GeminiInference
-from collect_data import collect_links, encode_images
+from collect_data import collect_links, collect_new_links, encode_images
+from dataprocessor import auction_id_from_link
+from work_queue import WorkQueue
+from auction_index import AuctionIndex
+from journal import ResultJournal
+from result_sink import ResultSink, export_results
+from http_client import rate_metrics
 
 import argparse
 
-import telebot
 import numpy as np
-import pandas as pd  
 import pickle 
 import requests
 import json
 
 from io import BytesIO
 from PIL import Image
-from IPython.display import clear_output
 
 import logging
 import time
-import random
+import os
+import queue
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from requests.exceptions import RequestException
 
 # Configure logging
@@ -46,6 +53,22 @@ def parse_args():
     parser.add_argument('--max-links', type=int, default=90, required=False, help="Maximum number of links to collect")
     parser.add_argument('--page-offset', type=int, default=0, required=False, help="The number off pages to skip")
     parser.add_argument('--links', nargs='+', default=None, required=False, help="List of Pregenerated links to work with")
+    parser.add_argument('--queue', type=str, default=None, required=False, help="Path to a shared SQLite work queue to pull links from")
+    parser.add_argument('--requests-per-minute', type=int, default=None, required=False, help="Gemini requests per minute allowed for each API key")
+    parser.add_argument('--tokens-per-minute', type=int, default=None, required=False, help="Gemini tokens per minute allowed for each API key")
+    parser.add_argument('--resume', action='store_true', help="Skip links already recorded in the result journal of a previous run")
+    parser.add_argument('--output-format', type=str, default='csv', choices=['csv', 'ndjson'], required=False, help="Format of the streamed result file")
+    parser.add_argument('--export-format', type=str, default='xlsx', choices=['xlsx', 'parquet', 'none'], required=False, help="Format of the final exported result file")
+    parser.add_argument('--picker-backend', type=str, default=None, choices=['keras', 'savedmodel', 'tflite'], required=False, help="Picker inference backend (default is Config.picker_backend)")
+    parser.add_argument('--picker-model-path', type=str, default=None, required=False, help="Weights, SavedModel directory or TFLite file for the picker backend")
+    parser.add_argument('--picker-image-size', type=int, default=None, required=False, help="Picker input resolution, e.g. 256 or 320 (default is Config.image_size)")
+    parser.add_argument('--no-recognition-cache', action='store_true', help="Always call Gemini, even for images recognized before")
+    parser.add_argument('--multi-image', type=int, default=0, required=False, help="Send the picker's top K images to Gemini in one request (0 disables)")
+    parser.add_argument('--crawl-concurrency', type=int, default=None, required=False, help="Search result pages fetched at once while collecting links (default is Config.crawl_concurrency)")
+    parser.add_argument('--index', type=str, default=None, required=False, help="Path to a shared SQLite index of processed auctions; listings in it are never recognized again")
+    parser.add_argument('--watch', action='store_true', help="Keep polling the first search page and process only new listings")
+    parser.add_argument('--watch-interval', type=float, default=None, required=False, help="Seconds between polls in watch mode (default is Config.watch_interval)")
+    parser.add_argument('--concurrency', type=int, default=1, required=False, help="Number of listings processed in parallel")
     parser.add_argument('--car-brand', type=str, required=True, help="Car brand to use for prompts. Supported brands: audi, toyota, nissan, suzuki, honda, daihatsu, subaru, mazda, bmw, lexus, volkswagen, volvo, mini, fiat, citroen, renault, ford, isuzu, opel, mitsubishi, mercedes, jaguar, peugeot, porsche, alfa_romeo, chevrolet")
 
     args = parser.parse_args()
@@ -87,23 +110,52 @@ def parse_args():
             'max_links': args.max_links,
             'car_brand': args.car_brand,
             'page-offset': args.page_offset,
-            'links': args.links
+            'links': args.links,
+            'concurrency': args.concurrency,
+            'crawl_concurrency': args.crawl_concurrency,
+            'index': args.index,
+            'watch': args.watch,
+            'watch_interval': args.watch_interval,
+            'queue': args.queue,
+            'requests_per_minute': args.requests_per_minute,
+            'tokens_per_minute': args.tokens_per_minute,
+            'resume': args.resume,
+            'output_format': args.output_format,
+            'export_format': args.export_format,
+            'picker_backend': args.picker_backend,
+            'picker_model_path': args.picker_model_path,
+            'picker_image_size': (args.picker_image_size, args.picker_image_size) if args.picker_image_size else None,
+            'use_recognition_cache': not args.no_recognition_cache,
+            'multi_image': args.multi_image
         },)
 
 import math
 
+def is_final_result(record:dict) -> bool:
+    """
+    Whether an encode() result settles its listing for good: Gemini answered for the
+    photos (a number or NONE), or the downloaded listing page has no images.
+
+    Anything else, such as ERROR after a failed page fetch, is left for a later run.
+    """
+    return record['predicted_number'] != 'ERROR'
+
 def encode(link:str, 
            picker:TargetModel, 
            model:GeminiInference,
+           multi_image:int = 0,
            **kwargs) -> dict:
     logging.info(f"Processing link: {link}")
     max_retries = 3
-    base_delay = 5
 
     for attempt in range(max_retries):
         try:
-            page_img_links = picker.processor.parse_images_from_page(link)
-            page_img_links = list(set(page_img_links))
+            # One page fetch gives both the image links and the price
+            listing = picker.processor.load_listing(link)
+            if listing is None:
+                # A failed download is an error to retry, not a listing without images
+                raise RuntimeError(f"Could not load listing page {link}")
+            page_img_links = listing['image_links']
             
             logging.info(f"Found {len(page_img_links)} unique image links")
             
@@ -128,6 +180,19 @@ def encode(link:str,
             
             detail_number = 'none'
             target_image_link = None
+
+            # Ask about the top-k images in one request first, fall back to one image at a time
+            if multi_image > 1 and len(images_probs) > 1:
+                top_links = [i['image_link'] for i in images_probs[:multi_image]]
+                try:
+                    logging.info(f'Predicting on top {len(top_links)} images at once')
+                    detail_number, target_image_link = model.recognize_many(top_links)
+                    detail_number = str(detail_number)
+                    # Found a number, or the top-k images were already checked: only the rest is left
+                    images_probs = [] if detail_number.lower().strip() != 'none' else images_probs[len(top_links):]
+                except Exception as e:
+                    logging.warning(f"Error processing top {len(top_links)} images, falling back to one image at a time: {e}")
+                    detail_number, target_image_link = 'none', None
             
             for target_image_link, score in [(i['image_link'], i['score']) for i in images_probs]:
                 try:
@@ -137,11 +202,7 @@ def encode(link:str,
                     if detail_number.lower().strip() != 'none':
                         break
                 except Exception as e:
-                    if "429 Resource has been exhausted" in str(e):
-                        delay = base_delay + random.uniform(0, 2)
-                        logging.warning(f"429 error encountered. Retrying in {delay:.2f} seconds...")
-                        time.sleep(delay)
-                        continue
+                    # Gemini 429s are absorbed by the API key pool, page fetches are paced per host
                     logging.warning(f"Error processing image {target_image_link}: {e}")
                     continue
             
@@ -150,19 +211,16 @@ def encode(link:str,
             
             logging.info(f"Predicted number id: {detail_number}")
 
-            parsed_info = picker.processor.load_product_info(link)
             return {
                 "predicted_number": detail_number, 
                 "url": link, 
-                "price": parsed_info.get('price', 'N/A'), 
+                "price": listing['price'], 
                 "correct_image_link": target_image_link, 
                 "incorrect_image_links": ", ".join([l for l in page_img_links if l != target_image_link])
             }
         except Exception as e:
             if attempt < max_retries - 1:
-                delay = base_delay + random.uniform(0, 2)
-                logging.warning(f"Error occurred: {e}. Retrying in {delay:.2f} seconds... (Attempt {attempt + 1}/{max_retries})")
-                time.sleep(delay)
+                logging.warning(f"Error occurred: {e}. Retrying... (Attempt {attempt + 1}/{max_retries})")
             else:
                 logging.error(f"Error processing link {link} after {max_retries} attempts: {e}")
                 return {
@@ -173,15 +231,6 @@ def encode(link:str,
                     "incorrect_image_links": "N/A"
                 }
 
-def save_intermediate_results(result, filename):
-    try:
-        pd.DataFrame(result).to_excel(f"{filename}.xlsx", index=False)
-        logging.info(f"Intermediate results saved to {filename}.xlsx")
-    except Exception as e:
-        logging.error(f"Error saving intermediate results to Excel: {e}. Saving in pickle format instead.")
-        with open(f'{filename}.pkl', 'wb') as f:
-            pickle.dump(result, f)
-
 def reduce(main_link:str, 
            picker:TargetModel, 
            model:GeminiInference,  # Add model as a parameter
@@ -191,53 +240,191 @@ def reduce(main_link:str,
            links:list = None, 
            savename:str = 'recognized_data',
            page_offset:int = 0, 
+           concurrency:int = 1,
+           queue_path:str = None,
+           resume:bool = False,
+           output_format:str = 'csv',
+           multi_image:int = 0,
+           crawl_concurrency:int = None,
+           index_path:str = None,
            **kwargs):
 
-    all_links = []
-    if links is None:
+    # Auctions recognized by any run or worker sharing the index are skipped
+    index = AuctionIndex(index_path) if index_path is not None else None
+
+    work_queue = None
+    if queue_path is not None:
+      # Links come from a queue shared with other main.py workers
+      work_queue = WorkQueue(queue_path)
+      if links is not None:
+        work_queue.put_many(list(set(links)))
+      all_links = []
+      logging.info(f"Pulling links from work queue {queue_path}: {work_queue.counts()}")
+    elif links is None:
       logging.info(f"Starting link collection from {main_link}")
-      all_links = collect_links(picker, main_link, max_pages=max_steps, max_links=max_links, offset=page_offset)
+      all_links = collect_links(picker.processor, main_link, max_pages=max_steps, max_links=max_links, offset=page_offset, concurrency=crawl_concurrency, index=index)
       all_links = list(set(all_links))
     else:
       all_links = list(set(links))
+    if index is not None:
+      all_links = index.filter_new(all_links, auction_id_from_link)
     print(all_links)
     logging.info(f"Collected {len(all_links)} unique links")
-               
-    result = {"predicted_number": list(), 
-              "url": list(), 
-              "price": list(), 
-              "correct_image_link": list(), 
-              "incorrect_image_links": list()}
-    
-    max_retries = 20
-    base_delay = 5  # Initial delay in seconds
-    
-    for i, page_link in enumerate(all_links):     
-        for attempt in range(max_retries):
-            try: 
-                # Add a small random delay before each request
-                time.sleep(random.uniform(1, 3))
-                
-                logging.info(f"Processing {i+1}/{len(all_links)} link: {page_link}")
-                encoded_data = encode(page_link, picker, model)  # Remove kwargs here
-                for (k, v) in encoded_data.items(): 
-                    result[k].append(v)
-
-                if (i + 1) % 10 == 0:  # Save every 10 iterations
-                    save_intermediate_results(result, f"{savename}_part_{i // 10 + 1}")
-                
-                logging.info("Processing successful")
-                break  # If successful, break out of the retry loop
 
+    # Settled results are journaled; with resume=True listings finished by an earlier run are skipped
+    journal = ResultJournal(f"{savename}.journal.jsonl", resume=resume)
+    if journal.records:
+      all_links = [link for link in all_links if link not in journal]
+      logging.info(f"Resuming: {len(journal.records)} links already processed, {len(all_links)} left")
+
+    # Links are handed out to `concurrency` workers; each worker runs its own
+    # encode() pipeline, so several listings are in flight at once.
+    pending = queue.Queue()
+    for i, page_link in enumerate(all_links):
+        pending.put((i, page_link))
+    claimed_count = itertools.count()
+
+    def next_link():
+        if work_queue is None:
+            try:
+                return pending.get_nowait()
+            except queue.Empty:
+                return None
+        page_link = work_queue.claim(worker=f"{os.getpid()}-{threading.get_ident()}")
+        return (next(claimed_count), page_link) if page_link is not None else None
+
+    # Results are streamed to {savename}.{output_format} as they arrive
+    sink = ResultSink(f"{savename}.{output_format}", output_format, append=resume)
+
+    resumed_records = list(journal.records.values())
+    records = {}
+    records_lock = threading.Lock()
+    stop_event = threading.Event()
+
+    def collect_result():
+        result = {"predicted_number": list(), 
+                  "url": list(), 
+                  "price": list(), 
+                  "correct_image_link": list(), 
+                  "incorrect_image_links": list()}
+        for record in resumed_records + [records[i] for i in sorted(records)]:
+            for (k, v) in record.items():
+                result[k].append(v)
+        return result
+
+    def worker():
+        # GeminiInference keeps per-image chat state, so every worker gets its own copy
+        worker_model = model.fork() if concurrency > 1 else model
+        while not stop_event.is_set():
+            claimed = next_link()
+            if claimed is None:
+                return
+            i, page_link = claimed
+            worker_name = f"{os.getpid()}-{threading.get_ident()}"
+            if page_link in journal or (index is not None and index.is_done(auction_id_from_link(page_link))):
+                logging.info(f"Skipping {page_link}: already processed")
+                if work_queue is not None:
+                    work_queue.finish(page_link)
+                continue
+            if index is not None and not index.claim(auction_id_from_link(page_link), page_link, worker_name):
+                # Another worker is on it; the link stays claimed in the queue, so a resumed run requeues it
+                logging.info(f"Skipping {page_link}: claimed by another worker")
+                continue
+
+            try: 
+                logging.info(f"Processing {i+1}/{len(all_links) or '?'} link: {page_link}")
+                encoded_data = encode(page_link, picker, worker_model, multi_image=multi_image)
             except Exception as e:
                 logging.error(f"Unexpected error processing link {page_link}: {e}")
+                if index is not None:
+                    index.release(auction_id_from_link(page_link))
+                if work_queue is not None:
+                    work_queue.finish(page_link, status='failed')
                 if not ignore_error:
                     logging.error("Stopping due to error and ignore_error=False")
-                    return result
+                    stop_event.set()
+                    return
                 logging.warning("Ignoring error and moving to next link")
-                break  # Move to next link if ignore_error is True
+                continue
+
+            # ERROR results are not journaled, so --resume and watch mode try those listings again
+            if is_final_result(encoded_data):
+                journal.append(encoded_data)
+            sink.write(encoded_data)
+            if index is not None:
+                # Only settled listings are done for every run; the rest stays open for a retry
+                if is_final_result(encoded_data):
+                    index.mark_done(auction_id_from_link(page_link))
+                else:
+                    index.release(auction_id_from_link(page_link))
+            if work_queue is not None:
+                work_queue.finish(page_link)
+
+            with records_lock:
+                records[i] = encoded_data
 
-    return result
+            logging.info("Processing successful")
+            logging.info(f"Host request rates: {rate_metrics()}")
+
+    if work_queue is None:
+        concurrency = min(concurrency, len(all_links))
+    concurrency = max(1, concurrency)
+    if concurrency == 1:
+        worker()
+    else:
+        logging.info(f"Processing links with {concurrency} concurrent workers")
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for future in [executor.submit(worker) for _ in range(concurrency)]:
+                future.result()
+
+    journal.close()
+    sink.close()
+    return collect_result()
+
+def watch(main_link:str, 
+          picker:TargetModel, 
+          model:GeminiInference, 
+          savename:str = 'recognized_data',
+          interval:float = None,
+          max_steps:int = 3, 
+          max_links:int = 90,
+          index_path:str = None,
+          **kwargs):
+    """
+    Poll the newest-first search at main_link every `interval` seconds and run reduce()
+    on the listings not seen before, until interrupted.
+
+    Seen auctions are the ones in the {savename} result journal (and in the shared
+    auction index if index_path is given), so a restarted watch continues where the
+    previous one stopped.
+
+    Returns:
+        dict: The result of the last reduce() call, covering every journaled listing.
+    """
+    interval = interval or cfg.watch_interval
+
+    def journaled_ids():
+        journal = ResultJournal(f"{savename}.journal.jsonl", resume=True)
+        journal.close()
+        return {auction_id_from_link(url) for url in journal.records}
+
+    seen_ids = journaled_ids()
+    index = AuctionIndex(index_path) if index_path is not None else None
+    logging.info(f"Watching {main_link} every {interval}s, {len(seen_ids)} auctions already seen")
+
+    encoding_result = None
+    try:
+        while True:
+            new_links = collect_new_links(picker.processor, main_link, seen_ids, max_pages=max_steps, max_links=max_links, index=index)
+            logging.info(f"Watch poll: {len(new_links)} new listings")
+            if new_links:
+                encoding_result = reduce(main_link, picker, model, links=new_links, savename=savename, resume=True, index_path=index_path, **kwargs)
+                # Listings that ended in ERROR are not journaled and are picked up again by the next poll
+                seen_ids.update(journaled_ids())
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        logging.info("Watch mode stopped")
+    return encoding_result
 
 if __name__ == "__main__": 
     # Parse important variables
@@ -255,14 +442,35 @@ if __name__ == "__main__":
     if model_name == 'gemini': 
         model = GeminiInference(api_keys=api_keys, 
                                 model_name=additional_data['gemini_model'], 
-                                car_brand=additional_data['car_brand'])
+                                car_brand=additional_data['car_brand'],
+                                requests_per_minute=additional_data['requests_per_minute'],
+                                tokens_per_minute=additional_data['tokens_per_minute'],
+                                use_cache=additional_data['use_recognition_cache'])
     else: 
         model = None 
 
-    picker = TargetModel()
+    picker = TargetModel(model_path=additional_data['picker_model_path'],
+                         backend=additional_data['picker_backend'],
+                         image_size=additional_data['picker_image_size'])
 
     logging.info(f"Starting encoding process with model: {model_name}")
-    encoding_result = reduce(
+    if additional_data['watch']:
+      encoding_result = watch(
+        additional_data['main_link'], 
+        picker=picker, 
+        model=model,
+        savename=additional_data['savename'],
+        interval=additional_data['watch_interval'],
+        max_steps=additional_data['max_steps'],
+        max_links=additional_data['max_links'],
+        ignore_error=additional_data['ignore_error'],
+        concurrency=additional_data['concurrency'],
+        output_format=additional_data['output_format'],
+        multi_image=additional_data['multi_image'],
+        index_path=additional_data['index']
+      )
+    else:
+      encoding_result = reduce(
         additional_data['main_link'], 
         picker=picker, 
         model=model,
@@ -271,19 +479,25 @@ if __name__ == "__main__":
         max_links=additional_data['max_links'],
         links=additional_data['links'],
         savename=additional_data['savename'],
-        page_offset=additional_data['page-offset'] 
-    )
-
-    # Save final results
-    try:
-        pd.DataFrame(encoding_result).to_excel(f"{additional_data['savename']}.xlsx", index=False)
-        logging.info(f"Final results saved to {additional_data['savename']}.xlsx")
-    except Exception as e:
-        logging.error(f"Error saving to Excel: {e}. Saving in pickle format instead.")
-        with open(f'{additional_data["savename"]}.pkl', 'wb') as f:
-            pickle.dump(encoding_result, f)
-        logging.info(f"Final results saved to {additional_data['savename']}.pkl")
-
-
-
-
+        page_offset=additional_data['page-offset'],
+        concurrency=additional_data['concurrency'],
+        queue_path=additional_data['queue'],
+        resume=additional_data['resume'],
+        output_format=additional_data['output_format'],
+        multi_image=additional_data['multi_image'],
+        crawl_concurrency=additional_data['crawl_concurrency'],
+        index_path=additional_data['index']
+      )
+
+    # Export final results
+    if additional_data['export_format'] != 'none':
+        stream_path = f"{additional_data['savename']}.{additional_data['output_format']}"
+        export_path = f"{additional_data['savename']}.{additional_data['export_format']}"
+        try:
+            export_results(stream_path, export_path)
+            logging.info(f"Final results saved to {export_path}")
+        except Exception as e:
+            logging.error(f"Error exporting results: {e}. Saving in pickle format instead.")
+            with open(f'{additional_data["savename"]}.pkl', 'wb') as f:
+                pickle.dump(encoding_result, f)
+            logging.info(f"Final results saved to {additional_data['savename']}.pkl")
@@ -0,0 +1,91 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class MicroBatcher():
+    """
+    Collects images from concurrently processed listings into shared forward passes.
+
+    Requests are gathered until batch_size images are waiting, every caller that
+    has submitted is in the batch, or max_wait seconds have passed since the first
+    one. A single predict_fn call then scores them all and every caller gets back
+    the rows that belong to its images. A lone caller is served at once, and
+    requests that arrive while a batch runs form the next one.
+    """
+    def __init__(self, predict_fn, batch_size, max_wait):
+        self.predict_fn = predict_fn
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        # Requests submitted and not answered yet, queued or in the batch being collected
+        self.waiting = 0
+        self.waiting_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="picker-micro-batcher", daemon=True)
+        self.thread.start()
+
+    def predict(self, images):
+        """
+        Score a stack of images, blocking until its batch has run.
+
+        Args:
+            images (np.ndarray): Images of one listing, shape (N, H, W, C).
+
+        Returns:
+            np.ndarray: Model outputs for these images, shape (N, ...).
+        """
+        future = Future()
+        with self.waiting_lock:
+            self.waiting += 1
+        self.requests.put((images, future))
+        return future.result()
+
+    def _collect(self):
+        pending = [self.requests.get()]
+        count = len(pending[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while count < self.batch_size:
+            # No other caller has submitted, waiting longer would only add latency
+            with self.waiting_lock:
+                if len(pending) >= self.waiting:
+                    break
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            pending.append(item)
+            count += len(item[0])
+        return pending
+
+    def _answered(self, pending):
+        with self.waiting_lock:
+            self.waiting -= len(pending)
+
+    def _run(self):
+        while True:
+            pending = self._collect()
+            try:
+                outputs = self.predict_fn(np.concatenate([images for images, _ in pending]))
+            except Exception as e:
+                self._answered(pending)
+                logging.error(f"Picker batch of {len(pending)} listings failed: {e}")
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            logging.info(f"Picker batch: {len(outputs)} images from {len(pending)} listings")
+            self._answered(pending)
+            offset = 0
+            for images, future in pending:
+                future.set_result(outputs[offset:offset + len(images)])
+                offset += len(images)
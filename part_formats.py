@@ -0,0 +1,49 @@
+import re
+
+# Separators the models put between number segments
+SEPARATORS = r'[\s.\-]'
+
+# Whole-number patterns (separators removed) for brands whose structure formats.json
+# cannot express, following the rules in format_part_number. tests/test_part_formats.py
+# checks these and formats.json against the example numbers in prompts.json
+COMPACT_PATTERNS = {
+    # VAG: 3 characters, 3 digits, 3-5 characters starting with a digit, optional index and software variant
+    'audi': r'^[A-Z0-9]{3}\d{3}\d[A-Z0-9]{2,7}$',
+    'volkswagen': r'^[A-Z0-9]{3}\d{3}\d[A-Z0-9]{2,7}$',
+    'bmw': r'^\d{4}\d?\d{6}\d{0,2}$',
+}
+
+
+def compile_segment_formats(format_spec):
+    """
+    Compile a formats.json spec like "5-5,5-4" into one regex.
+
+    Every segment must have exactly its length; separators between segments are optional.
+    """
+    alternatives = []
+    for brand_format in format_spec.split(","):
+        lengths = [int(length) for length in brand_format.strip().split("-")]
+        alternatives.append(f"{SEPARATORS}?".join(f"[A-Z0-9]{{{length}}}" for length in lengths))
+    return re.compile(f"^(?:{'|'.join(alternatives)})$")
+
+
+class PartNumberMatcher():
+    """
+    Local check of whether a string can be a part number of a brand.
+
+    Lets GeminiInference reject impossible candidates without a validator-model call.
+    Brands without any known format accept every candidate.
+    """
+    def __init__(self, formats, car_brand):
+        self.car_brand = car_brand
+        format_spec = formats.get(car_brand, {}).get("format")
+        self.segment_pattern = compile_segment_formats(format_spec) if format_spec else None
+        self.compact_pattern = re.compile(COMPACT_PATTERNS[car_brand]) if car_brand in COMPACT_PATTERNS else None
+
+    def match(self, number):
+        normalized = ' '.join(number.upper().split())
+        if self.segment_pattern is not None and not self.segment_pattern.match(normalized):
+            return False
+        if self.compact_pattern is not None and not self.compact_pattern.match(re.sub(SEPARATORS, '', normalized)):
+            return False
+        return True
@@ -3,11 +3,14 @@ from config import *
 
 import tensorflow as tf
 from tensorflow.keras.applications import MobileNetV3Small
-from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, BatchNormalization
+from tensorflow.keras.layers import Dense, GlobalAveragePooling2D, Dropout, BatchNormalization, Rescaling
 from tensorflow.keras.models import Model
 import numpy as np
+import os
 
-def build_model(num_classes) -> Model:
+from micro_batcher import MicroBatcher
+
+def build_model(num_classes, weights='imagenet', image_size=None) -> Model:
     """
     Builds a small image classifier using MobileNetV3Small backbone.
 
@@ -18,12 +21,15 @@ def build_model(num_classes) -> Model:
 
     Args:
       num_classes: Number of classes for classification.
+      weights: Backbone weights, 'imagenet' or None when a checkpoint is loaded afterwards.
+      image_size: Input (width, height), default is cfg.image_size. The head is size-agnostic,
+        so the 512x512 checkpoint also loads into smaller pickers.
 
     Returns:
       A Keras model.
     """
     # Load pre-trained MobileNetV3Small model (without top layers)
-    base_model = MobileNetV3Small(weights='imagenet', include_top=False, input_shape=(512, 512, 3))
+    base_model = MobileNetV3Small(weights=weights, include_top=False, input_shape=(*(image_size or cfg.image_size)[::-1], cfg.image_channels))
 
     # Add custom layers on top of the base model
     x = base_model.output
@@ -49,26 +55,124 @@ def build_model(num_classes) -> Model:
 
     return model
 
+def with_uint8_input(model) -> Model:
+    """
+    Wraps the picker so it takes raw uint8 images and normalizes them to [0, 1] inside the graph.
+
+    Args:
+      model: A model built by build_model.
+
+    Returns:
+      A Keras model with a uint8 input sharing the weights of model.
+    """
+    inputs = tf.keras.Input(shape=model.input_shape[1:], dtype='uint8')
+    x = Rescaling(1.0 / 255)(inputs)
+    return Model(inputs=inputs, outputs=model(x))
+
 # model = build_model(1)
 # model.load_weights(cfg.model_path)
 
-class TargetModel(metaclass=RuntimeMeta):
-  def __init__(self, model_path = None):
-    # self.gemini = GeminiInference()
-    if model_path == None: 
-      model_path = cfg.model_path
-
+def predict_in_chunks(predict_fn, images, batch_size):
+    return np.concatenate([predict_fn(images[i:i + batch_size]) for i in range(0, len(images), batch_size)])
 
-    self.model = build_model(1)
+class KerasBackend():
+  """
+  Runs the picker through the Keras model built from checkpoint weights.
+  """
+  def __init__(self, model_path, image_size=None):
+    # The checkpoint overrides every weight, so skip downloading ImageNet weights
+    self.model = build_model(1, weights=None, image_size=image_size)
     self.model.load_weights(model_path)
+    self.serving_model = with_uint8_input(self.model)
+
+  def predict(self, images):
+    return predict_in_chunks(self.serving_model.predict_on_batch, images, cfg.batch_size)
+
+class SavedModelBackend():
+  """
+  Runs the picker from a SavedModel written by export_picker.py.
+  """
+  def __init__(self, model_path, image_size=None):
+    self.serving_fn = tf.saved_model.load(model_path).signatures['serving_default']
+
+  def predict(self, images):
+    def predict_fn(batch):
+      outputs = self.serving_fn(tf.constant(batch))
+      return next(iter(outputs.values())).numpy()
+    return predict_in_chunks(predict_fn, images, cfg.batch_size)
+
+class TFLiteBackend():
+  """
+  Runs the picker from a (optionally int8-quantized) TFLite file written by export_picker.py.
+  The TFLite graph takes float input, so uint8 images are normalized one batch at a time.
+  """
+  def __init__(self, model_path, image_size=None, num_threads=None):
+    self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads or os.cpu_count())
+    self.input_details = self.interpreter.get_input_details()[0]
+    self.output_details = self.interpreter.get_output_details()[0]
+    self.input_shape = None
+
+  def predict_batch(self, batch):
+    input_index = self.input_details['index']
+    if self.input_shape != batch.shape:
+      self.interpreter.resize_tensor_input(input_index, batch.shape)
+      self.interpreter.allocate_tensors()
+      self.input_details = self.interpreter.get_input_details()[0]
+      self.output_details = self.interpreter.get_output_details()[0]
+      self.input_shape = batch.shape
+
+    batch = batch.astype('float32') / 255.0
+    input_dtype = self.input_details['dtype']
+    if np.issubdtype(input_dtype, np.integer):
+      scale, zero_point = self.input_details['quantization']
+      batch = np.clip(np.round(batch / scale + zero_point), np.iinfo(input_dtype).min, np.iinfo(input_dtype).max)
+    self.interpreter.set_tensor(input_index, batch.astype(input_dtype))
+    self.interpreter.invoke()
+
+    outputs = self.interpreter.get_tensor(self.output_details['index'])
+    if np.issubdtype(outputs.dtype, np.integer):
+      scale, zero_point = self.output_details['quantization']
+      outputs = (outputs.astype('float32') - zero_point) * scale
+    return outputs
+
+  def predict(self, images):
+    return predict_in_chunks(self.predict_batch, images, cfg.batch_size)
+
+PICKER_BACKENDS = {
+    'keras': KerasBackend,
+    'savedmodel': SavedModelBackend,
+    'tflite': TFLiteBackend,
+}
+
+def load_backend(backend, model_path=None, image_size=None):
+    """
+    Every backend's predict() takes a uint8 batch of shape (N, H, W, C) and returns scores of shape (N, 1).
+    """
+    assert backend in PICKER_BACKENDS, f"Unknown picker backend: {backend}"
+    default_paths = {'keras': cfg.model_path, 'savedmodel': cfg.savedmodel_path, 'tflite': cfg.tflite_model_path}
+    return PICKER_BACKENDS[backend](model_path or default_paths[backend], image_size=image_size)
 
-    self.processor = Processor(cfg.image_size, cfg.batch_size)
+class TargetModel(metaclass=RuntimeMeta):
+  def __init__(self, model_path = None, backend = None, image_size = None):
+    # self.gemini = GeminiInference()
+    # SavedModel and TFLite pickers run at the image_size they were exported with
+    self.image_size = tuple(image_size or cfg.image_size)
+    self.backend = load_backend(backend or cfg.picker_backend, model_path, self.image_size)
+    self.model = getattr(self.backend, 'model', None)
+
+    self.processor = Processor(self.image_size, cfg.batch_size)
 
     self.predicted_image_saving_path = "example_prediction.jpg"
 
+    # Images of concurrently processed listings share forward passes
+    self.batcher = MicroBatcher(self.backend.predict, cfg.batch_size, cfg.batch_max_wait)
+
   def do_inference_return_probs(self, image_links): 
-    dataset = self.processor(image_links)
-    predictions = self.model.predict(dataset)
+    image_links, images = self.processor.load_batch(image_links)
+    if not image_links:
+      logging.warning("No valid images to score.")
+      return []
+    predictions = self.batcher.predict(images)
 
     # Add a small epsilon to avoid log(0) or division by zero
     epsilon = 1e-10
@@ -88,8 +192,7 @@ class TargetModel(metaclass=RuntimeMeta):
     # save target_image_link to local image if it link. return local path
 
     if (target_image_link.startswith("http")):
-      response = requests.get(target_image_link)
-      img = Image.open(BytesIO(response.content))
+      img = Image.open(BytesIO(fetch_image(target_image_link)))
       img.save(self.predicted_image_saving_path)
       target_image_link = self.predicted_image_saving_path
 
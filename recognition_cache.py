@@ -0,0 +1,71 @@
+import logging
+import time
+
+from config import Config as cfg
+from sqlite_store import SQLiteStore
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class RecognitionCache(SQLiteStore):
+    """
+    Persistent cache of recognized part numbers.
+
+    Keyed by (image content hash, Gemini model name, prompt hash), so relisted photos
+    are answered without any API call. Entries expire after ttl seconds and the least
+    recently used ones are dropped once there are more than max_entries.
+    """
+    def __init__(self, path=None, ttl=None, max_entries=None):
+        super().__init__(path or cfg.recognition_cache_path)
+        self.ttl = ttl or cfg.recognition_cache_ttl
+        self.max_entries = max_entries or cfg.recognition_cache_max_entries
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS recognitions (
+                image_hash TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                number TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY (image_hash, model_name, prompt_hash)
+            )
+        """)
+
+    def get(self, image_hash, model_name, prompt_hash):
+        """
+        Return the cached number, or None if there is no fresh entry.
+        """
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute("""
+            SELECT number FROM recognitions
+            WHERE image_hash = ? AND model_name = ? AND prompt_hash = ? AND created_at >= ?
+        """, (image_hash, model_name, prompt_hash, now - self.ttl)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE recognitions SET last_used_at = ? WHERE image_hash = ? AND model_name = ? AND prompt_hash = ?",
+                     (now, image_hash, model_name, prompt_hash))
+        return row[0]
+
+    def put(self, image_hash, model_name, prompt_hash, number):
+        now = time.time()
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO recognitions VALUES (?, ?, ?, ?, ?, ?)",
+                     (image_hash, model_name, prompt_hash, number, now, now))
+        self.evict()
+
+    def evict(self):
+        """
+        Drop expired entries and the least recently used ones above max_entries.
+        """
+        conn = self._connect()
+        conn.execute("DELETE FROM recognitions WHERE created_at < ?", (time.time() - self.ttl,))
+        excess = conn.execute("SELECT COUNT(*) FROM recognitions").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute("""
+                DELETE FROM recognitions WHERE rowid IN (
+                    SELECT rowid FROM recognitions ORDER BY last_used_at LIMIT ?
+                )
+            """, (excess,))
+            logging.info(f"Recognition cache evicted {excess} entries")
@@ -0,0 +1,68 @@
+import csv
+import json
+import logging
+import os
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+RESULT_FIELDS = ["predicted_number", "url", "price", "correct_image_link", "incorrect_image_links"]
+
+
+class ResultSink():
+    """
+    Streaming writer that appends every encode() result exactly once.
+
+    Records go to an NDJSON or CSV file as they arrive, so the cost of saving grows
+    linearly with the number of listings.
+    """
+    def __init__(self, path, output_format=None, append=False):
+        self.path = path
+        self.output_format = output_format or ('csv' if path.endswith('.csv') else 'ndjson')
+        assert self.output_format in ['ndjson', 'csv'], f"Unsupported output format: {self.output_format}"
+        self.lock = threading.Lock()
+
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8', newline='')
+        if self.output_format == 'csv':
+            self.writer = csv.DictWriter(self.file, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+            if write_header:
+                self.writer.writeheader()
+
+    def write(self, record):
+        with self.lock:
+            if self.output_format == 'csv':
+                self.writer.writerow(record)
+            else:
+                self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def read_results(path):
+    """
+    Load a streamed result file into a DataFrame.
+    """
+    import pandas as pd
+
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return pd.DataFrame(columns=RESULT_FIELDS)
+    if path.endswith('.csv'):
+        return pd.read_csv(path, dtype=str, keep_default_na=False)
+    return pd.read_json(path, lines=True, dtype=False)
+
+
+def export_results(path, export_path):
+    """
+    Convert a streamed result file into a single xlsx or parquet file.
+    """
+    df = read_results(path)
+    if export_path.endswith('.parquet'):
+        df.to_parquet(export_path, index=False)
+    else:
+        df.to_excel(export_path, index=False)
+    logging.info(f"Exported {len(df)} results from {path} to {export_path}")
@@ -0,0 +1,23 @@
+import sqlite3
+import threading
+
+
+class SQLiteStore():
+    """
+    Base of the SQLite-backed stores (work queue, recognition cache, auction index).
+
+    Each thread gets its own autocommit connection to the database file in WAL mode,
+    so readers never block the writer and several processes can share the file.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def _connect(self):
+        # sqlite3 connections may not be shared between threads
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self.local.conn = conn
+        return conn
@@ -0,0 +1,46 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_client
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    requests_seen = 0
+
+    def do_GET(self):
+        type(self).requests_seen += 1
+        self.send_response(429)
+        self.send_header('Retry-After', '1')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def throttling_server():
+    ThrottlingHandler.requests_seen = 0
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ThrottlingHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_429_with_retry_after_reaches_host_controller(throttling_server):
+    controller = http_client.get_host_controller(throttling_server)
+    rate = controller.rate
+
+    response = http_client.get(throttling_server)
+
+    assert response.status_code == 429
+    # The adapter must not retry it on its own, the controller backs off instead
+    assert ThrottlingHandler.requests_seen == 1
+    assert controller.rate < rate
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_cache import ImageCache
+
+
+def test_evict_removes_url_entries_of_evicted_blobs(tmp_path):
+    cache = ImageCache(root=str(tmp_path), max_bytes=10 ** 6)
+    old = cache.put('https://example.com/old.jpg', b'a' * 100)
+    cache.put('https://example.com/old-copy.jpg', b'a' * 100)
+    new = cache.put('https://example.com/new.jpg', b'b' * 100)
+    os.utime(cache._blob_path(old), (1, 1))
+    os.utime(cache._blob_path(new), (2, 2))
+
+    cache.max_bytes = 150
+    cache.evict()
+
+    assert os.listdir(cache.blobs_dir) == [new]
+    assert os.listdir(cache.urls_dir) == [os.path.basename(cache._url_path('https://example.com/new.jpg'))]
+    assert cache.lookup('https://example.com/old.jpg') is None
+    assert cache.get('https://example.com/new.jpg') == b'b' * 100
+    assert cache.total_bytes == 100
+
+
+def test_evict_keeps_everything_within_budget(tmp_path):
+    cache = ImageCache(root=str(tmp_path), max_bytes=1000)
+    for i in range(3):
+        cache.put(f'https://example.com/{i}.jpg', bytes([i]) * 100)
+
+    cache.evict()
+
+    assert len(os.listdir(cache.blobs_dir)) == 3
+    assert len(os.listdir(cache.urls_dir)) == 3
@@ -0,0 +1,75 @@
+import json
+import os
+import re
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from part_formats import PartNumberMatcher
+
+with open(os.path.join(ROOT, 'formats.json'), 'r') as f:
+    FORMATS = json.load(f)
+
+with open(os.path.join(ROOT, 'prompts.json'), 'r') as f:
+    PROMPTS = json.load(f)
+
+
+def prompt_examples(prompts):
+    """
+    Collect the example part numbers from the "Example: ..." lines of a brand's prompts.
+    """
+    examples = []
+    for key in ('main_prompt', 'validation_prompt'):
+        for line in prompts.get(key, '').splitlines():
+            match = re.search(r'[Ee]xamples?:\s*(.+)$', line)
+            if match is None:
+                continue
+            for example in re.split(r',\s*|\s+or\s+', match.group(1)):
+                example = example.strip().strip('"')
+                # Skip remarks such as "9 characters"
+                if example and not example.endswith('characters'):
+                    examples.append(example)
+    return examples
+
+
+PROMPT_EXAMPLES = [(brand, example) for brand, prompts in PROMPTS.items() for example in prompt_examples(prompts)]
+
+
+@pytest.mark.parametrize('brand', sorted(FORMATS))
+def test_every_formatted_brand_has_prompt_examples(brand):
+    assert prompt_examples(PROMPTS.get(brand, {}))
+
+
+@pytest.mark.parametrize('brand,example', PROMPT_EXAMPLES)
+def test_prompt_examples_match(brand, example):
+    assert PartNumberMatcher(FORMATS, brand).match(example)
+
+
+@pytest.mark.parametrize('brand,number', [
+    # Formats the validation prompts allow without giving an example
+    ('nissan', '24012 8H5'),
+    ('nissan', '24012-8H5'),
+    ('honda', '9980SAAJ220M1'),
+    ('mazda', 'GJ6A-13-ZE'),
+    ('bmw', '11.31 7 839 015'),
+])
+def test_prompt_rules_match(brand, number):
+    assert PartNumberMatcher(FORMATS, brand).match(number)
+
+
+@pytest.mark.parametrize('brand,number', [
+    # The daihatsu prompt names this label number as one not to pick
+    ('daihatsu', '116RAI-000372'),
+    ('toyota', '89661-2248'),
+    ('nissan', '24012 8H'),
+    ('bmw', '11 31 7 839'),
+])
+def test_invalid_numbers_are_rejected(brand, number):
+    assert not PartNumberMatcher(FORMATS, brand).match(number)
+
+
+def test_brand_without_format_accepts_everything():
+    assert PartNumberMatcher(FORMATS, 'jaguar').match('C2D23405/1')
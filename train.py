@@ -1,33 +1,51 @@
-from dataprocessor import load_data
-from tensorflow.data import Dataset 
+from dataprocessor import load_array
+from config import Config as cfg
+from tensorflow.data import Dataset
 import tensorflow as tf
 
-tf.executing_eagerly()
+import argparse
+import hashlib
+import json
+import logging
+import os
+import numpy as np
 
+from picker_model import build_model
 
-from picker_model import TargetModel 
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def image_mapping_fn(image_link): 
-  image_link = bytes.decode(image_link.numpy())
-  # image_link = bytes.decode(image_link)
+def image_mapping_fn(image_link):
+  # Raw bytes come from the shared image cache, so every URL is downloaded only once
+  img = load_array(bytes.decode(image_link))
+  if img is None:
+    return np.zeros((*cfg.image_size[::-1], cfg.image_channels), dtype=np.uint8), False
+  return img, True
 
-  return load_data(image_link)
-
-class Trainer(TargetModel): 
-  def __init__(self, 
-               dataset = None, 
-               dataset_path=None): 
-    super().__init__()
-    
-    if dataset == None: 
+class Trainer():
+  def __init__(self,
+               dataset = None,
+               dataset_path = None,
+               initial_weights = None,
+               batch_size = cfg.batch_size,
+               cache_dir = 'train_cache',
+               checkpoint_dir = 'checkpoints'):
+    if dataset == None:
       dataset = self.read_from_dataset_path(dataset_path)
     self.dataset = dataset
 
-    self.dataset_dict = {} 
-    for item in self.dataset: 
-      self.dataset_dict = {**self.dataset_dict, **item}
+    # Fine-tune from an existing checkpoint, or start from ImageNet weights
+    self.model = build_model(1, weights=None if initial_weights else 'imagenet')
+    if initial_weights:
+      self.model.load_weights(initial_weights)
+
+    self.batch_size = batch_size
+    self.cache_dir = cache_dir
+    self.checkpoint_dir = checkpoint_dir
+    os.makedirs(cache_dir, exist_ok=True)
+    os.makedirs(checkpoint_dir, exist_ok=True)
 
-  def read_from_dataset_path(self, dataset_folder): 
+  def read_from_dataset_path(self, dataset_folder):
     json_files = []
     for root, dirs, files in os.walk(dataset_folder):
       for file in files:
@@ -35,21 +53,105 @@ class Trainer(TargetModel):
           json_files.append(os.path.join(root, file))
 
     data = []
-    for json_file in json_files:
+    for json_file in sorted(json_files):
       with open(json_file, 'r') as f:
         data.append(json.load(f))
-    return data 
+    return data
+
+  def split_dataset(self, validation_split):
+    # Split by listing so images of one listing never end up on both sides
+    num_validation = int(len(self.dataset) * validation_split)
+    train_items = self.dataset[:len(self.dataset) - num_validation]
+    validation_items = self.dataset[len(self.dataset) - num_validation:]
+
+    def flatten(items):
+      dataset_dict = {}
+      for item in items:
+        dataset_dict.update(item)
+      return list(dataset_dict.keys()), [float(label) for label in dataset_dict.values()]
+
+    return flatten(train_items), flatten(validation_items)
+
+  def build_dataset(self, image_links, labels, name, training=True):
+    """
+    Build a parallel input pipeline.
+
+    Images are downloaded and decoded with num_parallel_calls, the decoded uint8
+    images are cached on disk under cache_dir and reused by every later epoch,
+    and batches are prefetched while the model trains.
+    """
+    # The cache file is tied to the exact link list so a grown dataset gets a fresh cache
+    links_hash = hashlib.sha1("\n".join(image_links).encode('utf-8')).hexdigest()[:12]
+
+    def load(image_link, label):
+      img, ok = tf.numpy_function(image_mapping_fn, [image_link], [tf.uint8, tf.bool])
+      img.set_shape((*cfg.image_size[::-1], cfg.image_channels))
+      ok.set_shape(())
+      return img, label, ok
+
+    dataset = (Dataset.from_tensor_slices((image_links, labels))
+               .map(load, num_parallel_calls=tf.data.AUTOTUNE, deterministic=False)
+               .filter(lambda img, label, ok: ok)
+               .map(lambda img, label, ok: (img, label))
+               .cache(os.path.join(self.cache_dir, f"{name}_{links_hash}")))
+    if training:
+      dataset = dataset.shuffle(1024, reshuffle_each_iteration=True)
+
+    # Normalize after the cache so cached images stay uint8
+    dataset = dataset.map(lambda img, label: (tf.cast(img, tf.float32) / 255.0, label),
+                          num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.batch(self.batch_size).prefetch(tf.data.AUTOTUNE)
+
+  def train(self, epochs = 10, validation_split = 0.1):
+    (train_links, train_labels), (validation_links, validation_labels) = self.split_dataset(validation_split)
+    logging.info(f"Training on {len(train_links)} images, validating on {len(validation_links)} images")
+
+    train_dataset = self.build_dataset(train_links, train_labels, 'train')
+    validation_dataset = self.build_dataset(validation_links, validation_labels, 'validation', training=False) if validation_links else None
+
+    # Only one image per listing holds the label, so weight positives up
+    positives = max(sum(train_labels), 1)
+    class_weight = {0: 1.0, 1: (len(train_labels) - positives) / positives}
+
+    monitor = 'val_loss' if validation_dataset is not None else 'loss'
+    callbacks = [
+        tf.keras.callbacks.ModelCheckpoint(os.path.join(self.checkpoint_dir, 'picker_{epoch:02d}.weights.h5'),
+                                           save_weights_only=True),
+        tf.keras.callbacks.ModelCheckpoint(os.path.join(self.checkpoint_dir, 'best.weights.h5'),
+                                           monitor=monitor, save_best_only=True, save_weights_only=True),
+        tf.keras.callbacks.EarlyStopping(monitor=monitor, patience=3, restore_best_weights=True),
+    ]
+    return self.model.fit(train_dataset,
+                          validation_data=validation_dataset,
+                          epochs=epochs,
+                          class_weight=class_weight,
+                          callbacks=callbacks)
+
+def parse_args():
+    """
+    Main usage Example:
+
+        python train.py --dataset-path target_folder --initial-weights checkpoint.weights.h5 --epochs 10
+
+    """
+    parser = argparse.ArgumentParser(description="Train the picker on labelled collect_data.py JSON files")
+
+    parser.add_argument('--dataset-path', type=str, required=True, help="Folder with labelled JSON files, one listing per file")
+    parser.add_argument('--initial-weights', type=str, default=None, help="Checkpoint to fine-tune from (default starts from ImageNet weights)")
+    parser.add_argument('--epochs', type=int, default=10, help="Number of epochs")
+    parser.add_argument('--batch-size', type=int, default=cfg.batch_size, help="Training batch size")
+    parser.add_argument('--validation-split', type=float, default=0.1, help="Fraction of listings used for validation")
+    parser.add_argument('--cache-dir', type=str, default='train_cache', help="Where decoded images are cached between epochs")
+    parser.add_argument('--checkpoint-dir', type=str, default='checkpoints', help="Where checkpoints are written")
 
-  def build_dataset(self): 
-    image_links = list(self.dataset_dict.keys())
-    labels = list(self.dataset_dict.values()) 
-    
-    self.dataset = (Dataset.from_tensor_slices({"image": image_links, "l": labels})
-    .map(lambda i: {"image": tf.py_function(image_mapping_fn, [(i['image'])], [tf.float32]), "label": i['l']}))
-    return self.dataset.batch(128)
+    return parser.parse_args()
 
-  def train(self): 
-    dataset = self.build_dataset()
+if __name__ == '__main__':
+  args = parse_args()
 
-trainer = Trainer(dataset = correct_answers)
-trainer.train()
+  trainer = Trainer(dataset_path=args.dataset_path,
+                    initial_weights=args.initial_weights,
+                    batch_size=args.batch_size,
+                    cache_dir=args.cache_dir,
+                    checkpoint_dir=args.checkpoint_dir)
+  trainer.train(epochs=args.epochs, validation_split=args.validation_split)
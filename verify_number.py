@@ -3,11 +3,11 @@ import json
 import os
 from io import BytesIO
 from PIL import Image
-import requests
 
-from picker_model import TargetModel
+from dataprocessor import Processor
 from gemini_model import GeminiInference
 from config import Config
+from image_cache import fetch_image
 
 def verify_part_number(page_link, predicted_number, api_keys, gemini_model_name, car_brand):
     """
@@ -25,10 +25,10 @@ def verify_part_number(page_link, predicted_number, api_keys, gemini_model_name,
         str: Validation result from Gemini model.
     """
 
-    t = TargetModel() # Instantiate TargetModel to access its processor
+    processor = Processor(Config.image_size, Config.batch_size)
     model = GeminiInference(api_keys=api_keys, model_name=gemini_model_name, car_brand=car_brand)
 
-    page_img_links = t.processor.parse_images_from_page(page_link)
+    page_img_links = processor.parse_images_from_page(page_link)
     page_img_links = list(set(page_img_links))
 
     if not page_img_links:
@@ -40,8 +40,7 @@ def verify_part_number(page_link, predicted_number, api_keys, gemini_model_name,
     target_image_link = page_img_links[0]
 
     try:
-        response = requests.get(target_image_link, stream=True)
-        img_data = BytesIO(response.content)
+        img_data = BytesIO(fetch_image(target_image_link))
     except Exception as e:
         return f"Error downloading image: {e}"
 
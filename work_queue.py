@@ -0,0 +1,124 @@
+import logging
+import os
+import time
+
+from auction_index import AuctionIndex
+from dataprocessor import auction_id_from_link
+from sqlite_store import SQLiteStore
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+
+class WorkQueue(SQLiteStore):
+    """
+    SQLite-backed queue of listing links shared by all main.py workers.
+
+    Workers claim one link at a time, so fast workers simply take more links and
+    every worker finishes at roughly the same time.
+    """
+    def __init__(self, path):
+        super().__init__(path)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS links (
+                    url TEXT PRIMARY KEY,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    worker TEXT,
+                    updated_at REAL
+                )
+            """)
+
+    def put_many(self, links):
+        """
+        Add links to the queue, ignoring links that are already queued.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("INSERT OR IGNORE INTO links (url, updated_at) VALUES (?, ?)",
+                             [(link, time.time()) for link in links])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logging.info(f"Queued {len(links)} links in {self.path}")
+
+    def requeue_claimed(self):
+        """
+        Return links claimed by workers that died before finishing them to the queue.
+
+        Returns:
+            list: (url, worker) pairs of the requeued links and the workers that held them.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            links = conn.execute("SELECT url, worker FROM links WHERE status = 'claimed'").fetchall()
+            conn.execute("UPDATE links SET status = 'pending', worker = NULL WHERE status = 'claimed'")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logging.info(f"Requeued {len(links)} unfinished links")
+        return links
+
+    def claim(self, worker=None):
+        """
+        Atomically take the next pending link.
+
+        Returns:
+            str or None: The claimed link, or None if the queue is drained.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT url FROM links WHERE status = 'pending' ORDER BY rowid LIMIT 1").fetchone()
+            if row is not None:
+                conn.execute("UPDATE links SET status = 'claimed', worker = ?, updated_at = ? WHERE url = ?",
+                             (str(worker or os.getpid()), time.time(), row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row[0] if row is not None else None
+
+    def finish(self, url, status='done'):
+        """
+        Mark a claimed link as processed ('done') or failed ('failed').
+        """
+        self._connect().execute("UPDATE links SET status = ?, updated_at = ? WHERE url = ?",
+                                (status, time.time(), url))
+
+    def counts(self):
+        """
+        Return the number of links per status.
+        """
+        return dict(self._connect().execute("SELECT status, COUNT(*) FROM links GROUP BY status").fetchall())
+
+
+def build_queue(links, save_file_name, resume=False, index_path=None):
+    """
+    Create the work queue of a launcher run, or extend the existing one when resuming.
+
+    Returns:
+        str: Path of the queue file the main.py workers pull links from.
+    """
+    queue_path = f"{save_file_name}_queue.sqlite"
+    if index_path is not None:
+        # Auctions recognized by earlier or overlapping runs are not queued at all
+        links = AuctionIndex(index_path).filter_new(links, auction_id_from_link)
+    if resume and os.path.exists(queue_path):
+        work_queue = WorkQueue(queue_path)
+        requeued = work_queue.requeue_claimed()
+        if index_path is not None:
+            # The index claims of the dead workers would otherwise block the requeued links until they time out
+            AuctionIndex(index_path).release_claims([(auction_id_from_link(url), worker) for url, worker in requeued])
+        work_queue.put_many(links)
+        return queue_path
+
+    for stale_path in (queue_path, f"{queue_path}-wal", f"{queue_path}-shm"):
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+    WorkQueue(queue_path).put_many(links)
+    return queue_path